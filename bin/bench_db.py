@@ -0,0 +1,98 @@
+"""Benchmark database read/write throughput of the engine configurations.
+
+Compares the old single shared connection, which is only safe behind a lock, against the file-backed WAL engine from
+`tables.create_engine` with a mixed workload of concurrent readers and writers, e.g.:
+
+    python bin/bench_db.py --threads 16 --seconds 5
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import contextlib
+import pathlib
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import sqlalchemy as sa
+from sqlalchemy import pool
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import tables  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16, help="number of concurrent workers")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of every run")
+    parser.add_argument("--writers", type=float, default=0.1, help="share of write operations")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {
+            "memory, shared connection": _shared_engine("sqlite+pysqlite:///:memory:"),
+            "file, shared connection": _shared_engine(f"sqlite+pysqlite:///{pathlib.Path(directory) / 'shared.db'}"),
+            "file, WAL, connection pool": tables.create_engine(
+                f"sqlite+pysqlite:///{pathlib.Path(directory) / 'pooled.db'}", pool_size=args.threads
+            ),
+        }
+
+        for name, engine in engines.items():
+            serialize = isinstance(engine.pool, pool.StaticPool)
+            reads, writes = _run(engine, args.threads, args.seconds, args.writers, serialize)
+            print(f"{name:>26}: {reads / args.seconds:10.0f} reads/s {writes / args.seconds:10.0f} writes/s")
+            engine.dispose()
+
+
+def _shared_engine(url: str) -> sa.engine.Engine:
+    return sa.create_engine(url, future=True, connect_args={"check_same_thread": False}, poolclass=pool.StaticPool)
+
+
+def _run(engine: sa.engine.Engine, threads: int, seconds: float, writers: float, serialize: bool) -> tuple[int, int]:
+    tables.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(sa.insert(tables.users), [{"username": "author", "password": "", "salt": ""}])
+        rows = [{"author": "author", "title": f"title {i}", "description": "description"} for i in range(1000)]
+        connection.execute(sa.insert(tables.posts), rows)
+
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    connection_lock = threading.Lock() if serialize else contextlib.nullcontext()
+    counts = [0, 0]
+
+    def work():
+        rand = random.Random()
+        reads = writes = 0
+
+        while time.monotonic() < deadline:
+            if rand.random() < writers:
+                with connection_lock, engine.begin() as connection:
+                    values = {"author": "author", "title": "title", "description": "description"}
+                    connection.execute(sa.insert(tables.posts).values(**values))
+                writes += 1
+            else:
+                with connection_lock, engine.connect() as connection:
+                    select = sa.select(tables.posts).where(tables.posts.c.id == rand.randint(1, 1000))
+                    connection.execute(select).fetchone()
+                reads += 1
+
+        with lock:
+            counts[0] += reads
+            counts[1] += writes
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        for future in [executor.submit(work) for _ in range(threads)]:
+            future.result()
+
+    return counts[0], counts[1]
+
+
+if __name__ == "__main__":
+    main()
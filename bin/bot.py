@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import asyncio
 import dataclasses
-import itertools
 import json
 import random
+import time
 from typing import Iterable
 from urllib import parse
 
@@ -15,14 +15,17 @@ import httpx
 HOST = "http://localhost:8000"
 SIGNUP_URL = parse.urljoin(HOST, "/users")
 LOGIN_URL = parse.urljoin(HOST, "/users/login")
-MAKE_POST_URL = parse.urljoin(HOST, "/posts")
+MAKE_POSTS_URL = parse.urljoin(HOST, "/posts/batch")
+LIST_POSTS_URL = parse.urljoin(HOST, "/posts?limit=100")
 LIKE_POST_URL = parse.urljoin(HOST, "/posts/{id}/like")
 
 
 fake = faker.Faker()
+responses = 0
 
 
 async def main():
+    started = time.perf_counter()
     config = _load_config("config.json")
     users_number = fake.pyint(min_value=1, max_value=config["number_of_users"])
     signups = (_signup(f"user{i}", f"password{i}") for i in range(users_number))
@@ -31,10 +34,13 @@ async def main():
     await asyncio.gather(*logins)
     posts_number = fake.pyint(min_value=1, max_value=config["max_posts_per_user"])
     makes = (_make_posts(u, posts_number) for u in users)
-    posts = list(itertools.chain(*await asyncio.gather(*makes)))
+    await asyncio.gather(*makes)
+    posts = await users[0].posts()
     likes_number = fake.pyint(min_value=1, max_value=config["max_likes_per_user"])
     likes = (_like(u, posts, likes_number) for u in users)
     await asyncio.gather(*likes)
+    elapsed = time.perf_counter() - started
+    print(f"{responses} requests in {elapsed:.2f}s, {responses / elapsed:.0f} requests/s")
 
 
 def _load_config(path: str) -> dict[str, int]:
@@ -48,9 +54,8 @@ async def _signup(username: str, password: str) -> User:
     return user
 
 
-async def _make_posts(user: User, posts_number: int) -> tuple[dict, ...]:
-    makes = (user.post(f"title {user.name}", f"description {user.name}") for _ in range(posts_number))
-    return await asyncio.gather(*makes)
+async def _make_posts(user: User, posts_number: int):
+    await user.post([(f"title {user.name}", f"description {user.name}")] * posts_number)
 
 
 async def _like(user: User, posts: Iterable[dict], likes_number: int):
@@ -63,12 +68,21 @@ async def _like(user: User, posts: Iterable[dict], likes_number: int):
     await asyncio.gather(*likes)
 
 
+async def _count_response(_: httpx.Response):
+    global responses
+    responses += 1
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(event_hooks={"response": [_count_response]})
+
+
 @dataclasses.dataclass
 class User:
 
     name: str
     password: str
-    _client: httpx.AsyncClient = dataclasses.field(default_factory=httpx.AsyncClient)
+    _client: httpx.AsyncClient = dataclasses.field(default_factory=_client)
 
     async def signup(self):
         data = {"username": self.name, "password": self.password}
@@ -79,10 +93,19 @@ class User:
         resp = await self._client.post(LOGIN_URL, data=data)
         self._client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
 
-    async def post(self, title: str, description: str) -> dict:
-        make_resp = await self._client.post(MAKE_POST_URL, json={"title": title, "description": description})
-        get_resp = await self._client.get(parse.urljoin(HOST, make_resp.headers["location"]))
-        return get_resp.json()
+    async def post(self, posts: list[tuple[str, str]]):
+        data = [{"title": title, "description": description} for title, description in posts]
+        await self._client.post(MAKE_POSTS_URL, json=data)
+
+    async def posts(self) -> list[dict]:
+        found, url = [], LIST_POSTS_URL
+
+        while url:
+            page = (await self._client.get(url)).json()
+            found.extend(page["posts"])
+            url = next((parse.urljoin(HOST, link["href"]) for link in page["links"] if link["rel"] == "next"), None)
+
+        return found
 
     async def like(self, post: dict):
         await self._client.post(LIKE_POST_URL.format(id=post["id"]))
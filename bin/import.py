@@ -0,0 +1,171 @@
+"""Bulk import users, posts and likes straight into the database.
+
+Rows are read from NDJSON or CSV files, where fields are the table columns, and inserted in chunks with a single
+executemany per chunk. Every chunk is committed together with the import progress, so an interrupted import resumes
+after the last committed chunk when run again, e.g.:
+
+    python bin/import.py users users.csv
+    python bin/import.py posts posts.ndjson
+    python bin/import.py likes likes.ndjson --chunk-size 50000
+
+User passwords must be already hashed and encoded as by `hashing`, e.g. `pbkdf2_sha256$<iterations>$<salt>$<hash>`.
+Empty cells of non-text columns and nulls are left out, so the column defaults apply, e.g. the current date of likes.
+Rows conflicting with existing ones are skipped. Like counts and the daily likes rollup are rebuilt after importing
+posts or likes.
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import collections
+import csv
+import datetime
+import itertools
+import json
+import pathlib
+import sys
+from typing import Any, Callable, Iterable, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import hashing  # noqa: E402
+import migrations  # noqa: E402
+import posts  # noqa: E402
+import tables  # noqa: E402
+
+
+TABLES = {"users": tables.users, "posts": tables.posts, "likes": tables.likes}
+FORMATS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+progress_metadata = sa.MetaData()
+import_progress = sa.Table(
+    "import_progress",
+    progress_metadata,
+    sa.Column("source", sa.String, primary_key=True),
+    sa.Column("rows", sa.Integer, nullable=False),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=TABLES, help="imported table")
+    parser.add_argument("path", type=pathlib.Path, help="NDJSON or CSV file")
+    parser.add_argument(
+        "--format", choices=sorted(set(FORMATS.values())), help="file format, by its extension if not given"
+    )
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="number of rows inserted in one transaction")
+    parser.add_argument("--database", default=tables.DATABASE_URL, help="database URL")
+    args = parser.parse_args()
+
+    engine = tables.create_engine(args.database, pool_size=1)
+
+    with engine.begin() as connection:
+        migrations.migrate(connection)
+        import_progress.create(connection, checkfirst=True)
+
+    rows = _read(args.path, args.format or FORMATS.get(args.path.suffix, "ndjson"))
+    done = _import(engine, TABLES[args.table], f"{args.table}:{args.path.resolve()}", rows, args.chunk_size)
+    print(f"\rImported {done} rows")
+
+    if args.table in ("posts", "likes"):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            repaired = catalog.recount_likes()
+            days = catalog.rebuild_daily_likes()
+
+        print(f"Repaired like counts of {repaired} posts and rebuilt daily likes for {days} days")
+
+    engine.dispose()
+
+
+def _import(engine: sa.engine.Engine, table: sa.Table, source: str, rows: Iterable[dict], chunk_size: int) -> int:
+    with engine.connect() as connection:
+        select = sa.select(import_progress.c.rows).where(import_progress.c.source == source)
+        done = connection.execute(select).scalar() or 0
+
+    insert = sqlite.insert(table).on_conflict_do_nothing()
+    progress = sqlite.insert(import_progress).values(source=source, rows=sa.bindparam("b_rows"))
+    progress = progress.on_conflict_do_update(
+        index_elements=[import_progress.c.source], set_={"rows": progress.excluded.rows}
+    )
+    convert = _converter(table)
+
+    for chunk in _chunks(itertools.islice(rows, done, None), chunk_size):
+        groups = collections.defaultdict(list)
+
+        for row in map(convert, chunk):
+            groups[frozenset(row)].append(row)
+
+        with engine.begin() as connection:
+            for rows_ in groups.values():
+                connection.execute(insert, rows_)
+
+            connection.execute(progress, {"b_rows": done + len(chunk)})
+
+        done += len(chunk)
+        print(f"\r{done} rows", end="", flush=True)
+
+    return done
+
+
+def _read(path: pathlib.Path, format_: str) -> Iterator[dict]:
+    with path.open(newline="") as file:
+        if format_ == "csv":
+            yield from csv.DictReader(file)
+        else:
+            yield from (json.loads(line) for line in file if line.strip())
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    rows = iter(rows)
+
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def _converter(table: sa.Table) -> Callable[[dict], dict]:
+    parsers = {column.name: _parser(column) for column in table.columns}
+
+    def convert(row: dict) -> dict:
+        values = {
+            name: parsers[name](value)
+            for name, value in row.items()
+            if name in parsers and not _is_empty(table.c[name], value)
+        }
+
+        if table is tables.users:
+            algorithm = str(values.get("password", "")).split("$", 1)[0]
+
+            if algorithm not in hashing.HASHERS:
+                raise ValueError(f"Password of {values.get('username')} is not an encoded hash")
+
+            values.setdefault("salt", "")
+
+        return values
+
+    return convert
+
+
+def _parser(column: sa.Column) -> Callable[[Any], Any]:
+    if isinstance(column.type, sa.DateTime):
+        parse = datetime.datetime.fromisoformat
+    elif isinstance(column.type, sa.Date):
+        parse = datetime.date.fromisoformat
+    elif isinstance(column.type, sa.Integer):
+        parse = int
+    else:
+        parse = str
+
+    return parse
+
+
+def _is_empty(column: sa.Column, value: Any) -> bool:
+    return value is None or (value == "" and not isinstance(column.type, sa.String))
+
+
+if __name__ == "__main__":
+    main()
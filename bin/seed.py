@@ -0,0 +1,135 @@
+"""Seed the database with a large synthetic dataset for benchmarking.
+
+Users, posts and likes are written straight through SQLAlchemy Core in chunks. Post popularity follows a Zipf
+distribution over randomly ordered posts, and like dates are spread over the given number of days, more of them
+recent. Authors never like their own posts. The same seed and end date always produce the same dataset, e.g.:
+
+    python bin/seed.py --users 100000 --posts 1000000 --likes 10000000 --seed 1
+
+Passwords are not hashed per user, all users share one precomputed hash of the password "password". Like counts and
+the daily likes rollup are rebuilt once likes are written.
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import itertools
+import pathlib
+import random
+import sys
+from typing import Callable, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import hashing  # noqa: E402
+import migrations  # noqa: E402
+import posts  # noqa: E402
+import tables  # noqa: E402
+
+
+PASSWORD = "password"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000, help="number of users")
+    parser.add_argument("--posts", type=int, default=1_000_000, help="number of posts")
+    parser.add_argument("--likes", type=int, default=10_000_000, help="number of likes")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of posts popularity Zipf distribution")
+    parser.add_argument("--days", type=int, default=365, help="number of days likes are spread over")
+    parser.add_argument("--until", type=datetime.date.fromisoformat, default=datetime.date.today(), help="last day")
+    parser.add_argument("--seed", type=int, default=0, help="random generator seed")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="number of rows inserted in one transaction")
+    parser.add_argument("--database", default=tables.DATABASE_URL, help="database URL")
+    args = parser.parse_args()
+
+    if args.likes > (args.users - 1) * args.posts:
+        parser.error("more likes than pairs of posts and users other than their authors")
+
+    engine = tables.create_engine(args.database, pool_size=1)
+    rand = random.Random(args.seed)
+
+    with engine.begin() as connection:
+        migrations.migrate(connection)
+
+        if connection.execute(sa.select(sa.func.count()).select_from(tables.users)).scalar():
+            parser.error("database is not empty")
+
+    password = hashing.configured().hash(PASSWORD, salt=rand.randbytes(hashing.SALT_SIZE))
+    users = ({"username": _username(i), "password": password, "salt": ""} for i in range(args.users))
+    _insert(engine, sa.insert(tables.users), users, args.users, args.chunk_size, "users")
+
+    authors = [rand.randrange(args.users) for _ in range(args.posts)]
+    posts_ = (
+        {"id": i, "author": _username(author), "title": f"title {i}", "description": f"description {i}"}
+        for i, author in enumerate(authors, 1)
+    )
+    _insert(engine, sa.insert(tables.posts), posts_, args.posts, args.chunk_size, "posts")
+
+    likes = _likes(rand, args.users, authors, args.zipf, args.days, args.until)
+    _insert(engine, sqlite.insert(tables.likes).on_conflict_do_nothing(), likes, args.likes, args.chunk_size, "likes")
+
+    with engine.begin() as connection:
+        catalog = posts.Catalog(connection)
+        catalog.recount_likes()
+        catalog.rebuild_daily_likes()
+
+    engine.dispose()
+
+
+def _insert(engine: sa.engine.Engine, insert: sa.sql.Insert, rows: Iterator[dict], count: int, size: int, name: str):
+    inserted = 0
+
+    while inserted < count:
+        chunk = list(itertools.islice(rows, min(size, count - inserted)))
+
+        if not chunk:
+            break
+
+        with engine.begin() as connection:
+            inserted += connection.execute(insert, chunk).rowcount
+
+        print(f"\r{name}: {inserted}/{count}", end="", flush=True)
+
+    print()
+
+
+def _likes(
+    rand: random.Random, users: int, authors: list[int], zipf: float, days: int, until: datetime.date
+) -> Iterator[dict]:
+    ids = list(range(1, len(authors) + 1))
+    rand.shuffle(ids)
+    popular = _zipf(rand, len(authors), zipf)
+
+    while True:
+        for rank in popular(10_000):
+            post, user = ids[rank], rand.randrange(users)
+
+            if user == authors[post - 1]:
+                continue
+
+            day = until - datetime.timedelta(days=int(rand.triangular(0, days, 0)))
+            yield {"user": _username(user), "post": post, "date": day}
+
+
+def _zipf(rand: random.Random, n: int, s: float) -> Callable[[int], list[int]]:
+    weights = list(itertools.accumulate(1 / rank**s for rank in range(1, n + 1)))
+    population = range(n)
+
+    def sample(k: int) -> list[int]:
+        return rand.choices(population, cum_weights=weights, k=k)
+
+    return sample
+
+
+def _username(i: int) -> str:
+    return f"user{i:07d}"
+
+
+if __name__ == "__main__":
+    main()
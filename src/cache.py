@@ -0,0 +1,161 @@
+"""In-process caches."""
+
+
+import collections
+import dataclasses
+import math
+import sys
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+@dataclasses.dataclass
+class Stats:
+    """Cache usage counters."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class Cache:
+    """Bounded thread-safe LRU cache with entries expiry.
+
+    Least recently used entries are evicted when the cache is full either by entries or by bytes, expired entries are
+    dropped on access.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float = math.inf,
+        clock: Callable[[], float] = time.monotonic,
+        maxbytes: float = math.inf,
+        sizeof: Callable[[Any], int] | None = None,
+    ):
+        """Create cache.
+
+        Args:
+            maxsize: maximum number of entries.
+            ttl: default entries lifetime in seconds.
+            clock: monotonic time source.
+            maxbytes: maximum total size of cached values in bytes.
+            sizeof: estimates value size in bytes, by default sums sizes of nested dicts, lists and tuples items.
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._clock = clock
+        self._maxbytes = maxbytes
+        self._sizeof = sizeof or _sizeof
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[Hashable, tuple[Any, float, int]] = collections.OrderedDict()
+        self._bytes = 0
+        self._stats = Stats()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get cached value.
+
+        Args:
+            key: entry key.
+            default: returned for missing or expired entries.
+        Returns:
+            Cached value.
+        """
+        with self._lock:
+            try:
+                value, expires, _ = self._entries[key]
+            except KeyError:
+                self._stats.misses += 1
+                return default
+
+            if expires <= self._clock():
+                self._drop(key)
+                self._stats.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache value.
+
+        Args:
+            key: entry key.
+            value: cached value.
+            ttl: entry lifetime in seconds, cache default if not given, `math.inf` for entries that never expire.
+        """
+        expires = self._clock() + (self._ttl if ttl is None else ttl)
+        size = self._sizeof(value) if self._maxbytes < math.inf else 0
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (value, expires, size)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self._maxsize or self._bytes > self._maxbytes):
+                self._drop(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def pop(self, key: Hashable):
+        """Drop cached entry if any.
+
+        Args:
+            key: entry key.
+        """
+        with self._lock:
+            self._drop(key)
+
+    def invalidate(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop cached entries matching the predicate.
+
+        Args:
+            predicate: called with every entry key and value.
+        Returns:
+            Number of dropped entries.
+        """
+        with self._lock:
+            keys = [key for key, (value, _, _) in self._entries.items() if predicate(key, value)]
+
+            for key in keys:
+                self._drop(key)
+
+        return len(keys)
+
+    def clear(self):
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self) -> Stats:
+        """Snapshot of cache usage counters."""
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    @property
+    def nbytes(self) -> int:
+        """Total estimated size of cached values, only counted when the cache has bytes limit."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+def _sizeof(value: Any) -> int:
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_sizeof(item) for item in value)
+
+    return size
@@ -0,0 +1,312 @@
+"""Password hashing module.
+
+Hashes are stored encoded together with the algorithm and its parameters, e.g.
+`pbkdf2_sha256$<iterations>$<salt>$<hash>`, so the cost can be tuned per deployment while old hashes still verify.
+"""
+
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import concurrent.futures
+import dataclasses
+import hashlib
+import hmac
+import os
+import time
+from typing import Any, Callable, ClassVar, Protocol
+
+
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2_sha256")
+PASSWORD_HASH_COST = int(os.getenv("PASSWORD_HASH_COST", "0"))
+SALT_SIZE = 16
+
+
+class Overloaded(Exception):
+    """Password hashing pool is saturated."""
+
+
+class UnknownHash(Exception):
+    """Hash is encoded with unknown algorithm."""
+
+
+class Hasher(Protocol):
+    """Password hashing algorithm with fixed parameters."""
+
+    algorithm: ClassVar[str]
+    cost: int
+
+    def hash(self, password: str, salt: bytes | None = None) -> str:
+        """Hash password.
+
+        Args:
+            password: hashed password.
+            salt: password salt, random if not given.
+        Returns:
+            Encoded password hash.
+        """
+
+    def params(self) -> list[str]:
+        """Get encoded parameters of the algorithm."""
+
+
+@dataclasses.dataclass(frozen=True)
+class PBKDF2Hasher:
+    """PBKDF2 with HMAC-SHA256, cost is the number of iterations."""
+
+    algorithm: ClassVar[str] = "pbkdf2_sha256"
+    cost: int = 100_000
+    length: int = 32
+
+    def hash(self, password: str, salt: bytes | None = None) -> str:
+        salt = os.urandom(SALT_SIZE) if salt is None else salt
+        password_hash = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.cost, self.length)
+        return _encode(self, salt, password_hash)
+
+    def params(self) -> list[str]:
+        return [str(self.cost)]
+
+    @classmethod
+    def decode(cls, params: list[str], password_hash: bytes) -> PBKDF2Hasher:
+        (cost,) = params
+        return cls(int(cost), len(password_hash))
+
+
+@dataclasses.dataclass(frozen=True)
+class ScryptHasher:
+    """Scrypt, cost is the CPU/memory cost parameter N, a power of two."""
+
+    algorithm: ClassVar[str] = "scrypt"
+    cost: int = 2**14
+    block_size: int = 8
+    parallelism: int = 1
+    length: int = 32
+
+    def hash(self, password: str, salt: bytes | None = None) -> str:
+        salt = os.urandom(SALT_SIZE) if salt is None else salt
+        maxmem = 128 * self.block_size * (self.cost + self.parallelism + 2) + 2**20
+        password_hash = hashlib.scrypt(
+            password.encode(),
+            salt=salt,
+            n=self.cost,
+            r=self.block_size,
+            p=self.parallelism,
+            maxmem=maxmem,
+            dklen=self.length,
+        )
+        return _encode(self, salt, password_hash)
+
+    def params(self) -> list[str]:
+        return [str(self.cost), str(self.block_size), str(self.parallelism)]
+
+    @classmethod
+    def decode(cls, params: list[str], password_hash: bytes) -> ScryptHasher:
+        cost, block_size, parallelism = map(int, params)
+        return cls(cost, block_size, parallelism, len(password_hash))
+
+
+HASHERS: dict[str, type[PBKDF2Hasher] | type[ScryptHasher]] = {
+    PBKDF2Hasher.algorithm: PBKDF2Hasher,
+    ScryptHasher.algorithm: ScryptHasher,
+}
+
+
+def configured() -> Hasher:
+    """Get hasher configured for the deployment with `PASSWORD_HASHER` and `PASSWORD_HASH_COST`."""
+    hasher_cls = HASHERS[PASSWORD_HASHER]
+    return hasher_cls(PASSWORD_HASH_COST) if PASSWORD_HASH_COST else hasher_cls()
+
+
+def verify(password: str, encoded: str) -> bool:
+    """Check password against encoded hash.
+
+    Args:
+        password: checked password.
+        encoded: encoded password hash.
+    Raises:
+        UnknownHash: hash algorithm is not supported.
+    Returns:
+        Whether password matches the hash.
+    """
+    hasher, salt, _ = _decode(encoded)
+    return hmac.compare_digest(hasher.hash(password, salt), encoded)
+
+
+def needs_rehash(encoded: str, hasher: Hasher) -> bool:
+    """Check whether hash was produced with other algorithm or parameters than the hasher.
+
+    Args:
+        encoded: encoded password hash.
+        hasher: currently used hasher.
+    Returns:
+        Whether password should be hashed again.
+    """
+    try:
+        return _decode(encoded)[0] != hasher
+    except UnknownHash:
+        return True
+
+
+def encode_legacy(password_hash: bytes, salt: bytes) -> str:
+    """Encode hash saved before hashes were encoded, PBKDF2 with 100000 iterations.
+
+    Args:
+        password_hash: raw password hash.
+        salt: password salt.
+    Returns:
+        Encoded password hash.
+    """
+    return _encode(PBKDF2Hasher(100_000, len(password_hash)), salt, password_hash)
+
+
+def calibrate(algorithm: str, target: float, timer: Callable[[], float] = time.perf_counter) -> Hasher:
+    """Find the highest cost of the algorithm hashing within the target duration on this host.
+
+    Cost is doubled starting from a minimal one until hashing takes longer than the target.
+
+    Args:
+        algorithm: name of calibrated algorithm.
+        target: target hashing duration in seconds.
+        timer: time source.
+    Returns:
+        Hasher with calibrated cost, the minimal one if even it exceeds the target.
+    """
+    hasher_cls = HASHERS[algorithm]
+    cost = 2**10 if hasher_cls is ScryptHasher else 10_000
+    hasher = hasher_cls(cost)
+
+    while True:
+        candidate = hasher_cls(cost * 2)
+        started = timer()
+        candidate.hash("calibration")
+
+        if timer() - started > target:
+            return hasher
+
+        hasher, cost = candidate, cost * 2
+
+
+@dataclasses.dataclass
+class Timing:
+    """Durations summary."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float):
+        """Record duration.
+
+        Args:
+            seconds: observed duration.
+        """
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class HashPool:
+    """Process pool hashing passwords off the event loop.
+
+    Hashes are CPU bound, so a burst of them in the web workers threads starves all other requests. The pool runs
+    them in separate processes and rejects new work once too many hashes are waiting.
+    """
+
+    def __init__(self, workers: int | None = None, max_pending: int = 64):
+        """Create pool, worker processes are started on first use.
+
+        Args:
+            workers: number of worker processes, CPUs count by default.
+            max_pending: number of submitted and not finished hashes after which new ones are rejected.
+        """
+        self._workers = workers
+        self._max_pending = max_pending
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._pending = 0
+        self.rejected = 0
+        self.queue_time = Timing()
+        self.hash_time = Timing()
+
+    async def hash(self, hasher: Hasher, password: str) -> str:
+        """Hash password in a worker process.
+
+        Args:
+            hasher: hashing algorithm.
+            password: hashed password.
+        Raises:
+            Overloaded: too many hashes are waiting.
+        Returns:
+            Encoded password hash.
+        """
+        return await self._submit(hasher.hash, password)
+
+    async def verify(self, password: str, encoded: str) -> bool:
+        """Check password against encoded hash in a worker process, see `verify`.
+
+        Raises:
+            Overloaded: too many hashes are waiting.
+        """
+        return await self._submit(verify, password, encoded)
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted and not finished hashes."""
+        return self._pending
+
+    def shutdown(self):
+        """Stop worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _submit(self, func: Callable[..., Any], *args) -> Any:
+        if self._pending >= self._max_pending:
+            self.rejected += 1
+            raise Overloaded
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+
+        self._pending += 1
+        submitted = time.time()
+
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._executor, _timed, func, *args)
+        finally:
+            self._pending -= 1
+
+        self.queue_time.observe(max(started - submitted, 0.0))
+        self.hash_time.observe(finished - started)
+        return result
+
+
+def _encode(hasher: Hasher, salt: bytes, password_hash: bytes) -> str:
+    return "$".join([hasher.algorithm, *hasher.params(), _b64encode(salt), _b64encode(password_hash)])
+
+
+def _decode(encoded: str) -> tuple[Hasher, bytes, bytes]:
+    algorithm, *params, salt, password_hash = encoded.split("$")
+
+    try:
+        hasher_cls = HASHERS[algorithm]
+    except KeyError:
+        raise UnknownHash(algorithm)
+
+    password_hash_ = _b64decode(password_hash)
+    return hasher_cls.decode(params, password_hash_), _b64decode(salt), password_hash_
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _timed(func: Callable[..., Any], *args) -> tuple[Any, float, float]:
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
@@ -0,0 +1,62 @@
+"""Management commands.
+
+Run from the sources directory, e.g.:
+
+    python -m manage migrate
+"""
+
+
+import argparse
+
+import hashing
+import migrations
+import posts
+import tables
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="bring database schema up to date").set_defaults(run=_migrate)
+    commands.add_parser("recount-likes", help="repair posts like counts").set_defaults(run=_recount_likes)
+    commands.add_parser("rebuild-analytics", help="rebuild daily likes rollup").set_defaults(run=_rebuild_analytics)
+    calibrate = commands.add_parser("calibrate-hasher", help="pick password hashing cost for this host")
+    calibrate.add_argument("--algorithm", choices=sorted(hashing.HASHERS), default=hashing.PASSWORD_HASHER)
+    calibrate.add_argument("--target-ms", type=float, default=250, help="target hashing duration")
+    calibrate.set_defaults(run=_calibrate_hasher)
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+def _migrate(_: argparse.Namespace):
+    with tables.engine.begin() as connection:
+        applied = migrations.migrate(connection)
+
+    if applied:
+        print(f"Applied migrations: {', '.join(map(str, applied))}")
+    else:
+        print("Database schema is up to date")
+
+
+def _recount_likes(_: argparse.Namespace):
+    with tables.engine.begin() as connection:
+        repaired = posts.Catalog(connection).recount_likes()
+
+    print(f"Repaired like counts of {repaired} posts")
+
+
+def _rebuild_analytics(_: argparse.Namespace):
+    with tables.engine.begin() as connection:
+        days = posts.Catalog(connection).rebuild_daily_likes()
+
+    print(f"Rebuilt daily likes for {days} days")
+
+
+def _calibrate_hasher(args: argparse.Namespace):
+    hasher = hashing.calibrate(args.algorithm, args.target_ms / 1000)
+    print(f"PASSWORD_HASHER={hasher.algorithm}")
+    print(f"PASSWORD_HASH_COST={hasher.cost}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Database schema migrations.
+
+`tables.metadata` describes the latest schema and `create_all` creates it for new databases, but it never changes
+existing tables. Migrations bring older databases up to date, every one of them is applied once in order and its
+version is recorded in `schema_versions`. New databases are created at the latest version straight away.
+"""
+
+
+from typing import Callable
+
+import sqlalchemy as sa
+from sqlalchemy.engine import base
+
+import tables
+
+
+Migration = Callable[[base.Connection], None]
+
+
+def _add_likes_indexes(connection: base.Connection):
+    connection.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_likes_date ON likes (date)"))
+    connection.execute(sa.text('CREATE INDEX IF NOT EXISTS ix_likes_post_user ON likes (post, "user")'))
+    connection.execute(sa.text('CREATE INDEX IF NOT EXISTS ix_likes_user ON likes ("user")'))
+
+
+def _add_posts_author_index(connection: base.Connection):
+    connection.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_posts_author_id ON posts (author, id)"))
+
+
+def _add_posts_like_count(connection: base.Connection):
+    if "like_count" not in {c["name"] for c in sa.inspect(connection).get_columns("posts")}:
+        connection.execute(sa.text("ALTER TABLE posts ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0"))
+
+    connection.execute(
+        sa.text("UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post = posts.id)")
+    )
+
+
+def _fill_likes_daily(connection: base.Connection):
+    connection.execute(sa.text("DELETE FROM likes_daily"))
+    connection.execute(
+        sa.text("INSERT INTO likes_daily (date, likes) SELECT date(date), count(*) FROM likes GROUP BY date(date)")
+    )
+
+
+def _replace_posts_author_index(connection: base.Connection):
+    connection.execute(sa.text("DROP INDEX IF EXISTS ix_posts_author_id"))
+    connection.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_posts_author_id_desc ON posts (author, id DESC)"))
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    _add_likes_indexes,
+    _add_posts_author_index,
+    _add_posts_like_count,
+    _fill_likes_daily,
+    _replace_posts_author_index,
+)
+
+
+def migrate(connection: base.Connection) -> list[int]:
+    """Bring database schema up to date.
+
+    Safe to run any number of times, already applied migrations are skipped.
+
+    Args:
+        connection: connection to the migrated database.
+    Returns:
+        Versions of applied migrations.
+    """
+    new = not sa.inspect(connection).has_table(tables.posts.name)
+    tables.metadata.create_all(connection)
+
+    current = connection.execute(sa.select(sa.func.max(tables.schema_versions.c.version))).scalar() or 0
+    applied = []
+
+    for version, migration in enumerate(MIGRATIONS[current:], current + 1):
+        if not new:
+            migration(connection)
+
+        connection.execute(sa.insert(tables.schema_versions).values(version=version))
+        applied.append(version)
+
+    return applied
@@ -1,18 +1,29 @@
 """Posts module."""
 
 
+from __future__ import annotations
+
+import collections
 import datetime
-from typing import Optional
+import enum
+import functools
+import os
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Sequence
 
 import pydantic
 import sqlalchemy as sa
-from sqlalchemy import exc
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.engine import base
+from sqlalchemy.ext import asyncio
 
+import cache
 import tables
 
 
+ANALYTICS_CLOSED_TTL = float(os.getenv("ANALYTICS_CLOSED_TTL", "3600"))
+
 ID = int
+_POST_CONTENT = ("id", "author", "title", "description")
 
 
 class AlreadyLiked(Exception):
@@ -31,6 +42,65 @@ class NotFound(Exception):
     """Post not found in catalog."""
 
 
+class TooManyBuckets(Exception):
+    """Analytics time series would have more periods than allowed."""
+
+
+class Bucket(str, enum.Enum):
+    """Analytics time series bucket."""
+
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+    def start(self, date: datetime.date) -> datetime.date:
+        """Get start of the bucket containing the date."""
+        if self is Bucket.WEEK:
+            return date - datetime.timedelta(days=date.weekday())
+
+        if self is Bucket.MONTH:
+            return date.replace(day=1)
+
+        return date
+
+    def next(self, date: datetime.date) -> datetime.date:
+        """Get start of the bucket following the one starting at the date."""
+        if self is Bucket.WEEK:
+            return date + datetime.timedelta(weeks=1)
+
+        if self is Bucket.MONTH:
+            return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+        return date + datetime.timedelta(days=1)
+
+    def count(self, start: datetime.date, last: datetime.date) -> int:
+        """Get number of buckets from the one starting at the start date up to the one starting at the last date."""
+        if self is Bucket.WEEK:
+            return (last - start).days // 7 + 1
+
+        if self is Bucket.MONTH:
+            return (last.year - start.year) * 12 + last.month - start.month + 1
+
+        return (last - start).days + 1
+
+
+class LikeAction(str, enum.Enum):
+    """Change of user like on a post."""
+
+    LIKE = "like"
+    UNLIKE = "unlike"
+
+
+class LikeResult(str, enum.Enum):
+    """Outcome of a like change in a batch."""
+
+    OK = "ok"
+    ALREADY_LIKED = "already_liked"
+    AUTHOR_LIKED = "author_liked"
+    NOT_LIKED = "not_liked"
+    NOT_FOUND = "not_found"
+
+
 class MakePostRequest(pydantic.BaseModel):
     """Request for a new post."""
 
@@ -38,11 +108,32 @@ class MakePostRequest(pydantic.BaseModel):
     description: str
 
 
+class LikeRequest(pydantic.BaseModel):
+    """Request for liking or unliking a post."""
+
+    post_id: ID
+    action: LikeAction = LikeAction.LIKE
+
+
 class Catalog:
     """Catalog of users posts."""
 
-    def __init__(self, connection: base.Connection):
+    def __init__(
+        self,
+        connection: base.Connection,
+        analytics_cache: cache.Cache | None = None,
+        post_cache: cache.Cache | None = None,
+    ):
+        """Create catalog.
+
+        Args:
+            connection: database connection.
+            analytics_cache: shared cache of aggregated likes counts by date range.
+            post_cache: shared cache of posts author, title and description by ID, which never change.
+        """
         self._connection = connection
+        self._analytics_cache = analytics_cache
+        self._post_cache = post_cache
 
     def make_post(self, author: str, req: MakePostRequest) -> ID:
         """Make a new post.
@@ -57,21 +148,107 @@ class Catalog:
         result = self._connection.execute(stmt)
         return result.inserted_primary_key.id
 
+    def make_posts(self, author: str, reqs: Sequence[MakePostRequest]) -> list[ID]:
+        """Make new posts in bulk.
+
+        The first post is inserted alone, which takes the database write lock, and the rest follow it with consecutive
+        IDs in a single executemany, so no other writer can take those IDs in between.
+
+        Args:
+            author: user making new posts.
+            reqs: new post requests.
+        Returns:
+            New posts IDs in requests order.
+        """
+        if not reqs:
+            return []
+
+        first_id = self.make_post(author, reqs[0])
+        post_ids = list(range(first_id, first_id + len(reqs)))
+
+        if len(reqs) > 1:
+            rows = [
+                {"id": post_id, "author": author, "title": req.title, "description": req.description}
+                for post_id, req in zip(post_ids[1:], reqs[1:])
+            ]
+            self._connection.execute(sa.insert(tables.posts), rows)
+
+        return post_ids
+
     def get(self, post_id: ID) -> Optional[dict]:
         """Get post from catalog.
 
+        Posts content is read through the post cache when the catalog has one, only their like count is always read
+        from the database, so likes of popular posts do not drop them from the cache.
+
         Args:
             post_id: unique ID to look for.
         Returns:
             Saved post in catalog if found.
         """
-        select = sa.select(tables.posts).where(tables.posts.c.id == post_id)
-        result = self._connection.execute(select).fetchone()
+        post = self._read(post_id, None)
 
-        if not result:
-            return None
+        if post is not None:
+            del post["liked"]
+
+        return post
 
-        return dict(result)
+    def get_for_viewer(self, post_id: ID, username: str | None) -> Optional[dict]:
+        """Get post from catalog together with the viewer like in a single query.
+
+        For a cached post only its like count and the viewer like are queried.
+
+        Args:
+            post_id: unique ID to look for.
+            username: viewing user, anonymous if not given.
+        Returns:
+            Saved post in catalog with `liked` flag if found.
+        """
+        return self._read(post_id, username)
+
+    def list(self, after: ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts in ID order.
+
+        Pages are continued from the last seen ID rather than skipped by offset, so every page is a primary key range
+        scan costing the same however deep it is.
+
+        Args:
+            after: ID of the last post on the previous page, the first page if not given.
+            limit: maximum number of listed posts.
+        Returns:
+            Posts following the given ID.
+        """
+        select = sa.select(tables.posts).order_by(tables.posts.c.id).limit(limit)
+
+        if after is not None:
+            select = select.where(tables.posts.c.id > after)
+
+        return [dict(row) for row in self._connection.execute(select)]
+
+    def list_by_author(self, author: str, before: ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts of the author, newest first.
+
+        Pages are continued from the last seen ID over the (author, id DESC) index, so every page is a bounded index
+        range scan however many posts the author has.
+
+        Args:
+            author: user who made the posts.
+            before: ID of the last post on the previous page, the first page if not given.
+            limit: maximum number of listed posts.
+        Returns:
+            Author posts preceding the given ID.
+        """
+        select = (
+            sa.select(tables.posts)
+            .where(tables.posts.c.author == author)
+            .order_by(tables.posts.c.id.desc())
+            .limit(limit)
+        )
+
+        if before is not None:
+            select = select.where(tables.posts.c.id < before)
+
+        return [dict(row) for row in self._connection.execute(select)]
 
     def has_like(self, post_id: ID, username: str) -> bool:
         """Check whether the user has liked the post.
@@ -82,13 +259,31 @@ class Catalog:
         Returns:
             Whether the user has liked the post.
         """
-        select = sa.select(tables.likes).where(tables.likes.c.post == post_id and tables.likes.c.user == username)
-        result = self._connection.execute(select)
-        return bool(result.fetchone())
+        like = sa.exists().where(tables.likes.c.post == post_id, tables.likes.c.user == username)
+        return bool(self._connection.execute(sa.select(like)).scalar())
+
+    def has_likes(self, post_ids: Iterable[ID], username: str) -> dict[ID, bool]:
+        """Check whether the user has liked each of the posts.
+
+        Args:
+            post_ids: unique IDs to look for.
+            username: checking user.
+        Returns:
+            Whether the user has liked the post for every given post ID.
+        """
+        post_ids = set(post_ids)
+        select = sa.select(tables.likes.c.post).where(
+            tables.likes.c.user == username, tables.likes.c.post.in_(post_ids)
+        )
+        liked = set(self._connection.execute(select).scalars())
+        return {post_id: post_id in liked for post_id in post_ids}
 
     def like(self, post_id: ID, username):
         """Like post.
 
+        The like is inserted by a single statement only if the post exists, is not made by the user and was not liked
+        by them before. The reason is looked up only when nothing was inserted.
+
         Args:
             post_id: unique ID to look for.
             username: checking user.
@@ -97,45 +292,245 @@ class Catalog:
             AuthorLiked: author attempted to like the post.
             AlreadyLiked: user attempted to like the post he already liked.
         """
-        post = self.get(post_id)
+        today = datetime.datetime.utcnow().date()
+        select = sa.select(tables.posts.c.id, sa.literal(username), sa.literal(today, sa.Date)).where(
+            tables.posts.c.id == post_id, tables.posts.c.author.is_distinct_from(username)
+        )
+        insert = sqlite.insert(tables.likes).from_select(["post", "user", "date"], select)
+        insert = insert.on_conflict_do_nothing(index_elements=[tables.likes.c.user, tables.likes.c.post])
+
+        if self._connection.execute(insert).rowcount:
+            self._count_likes({post_id: 1}, {today: 1})
+            return
 
-        if post is None:
+        author = self._connection.execute(sa.select(tables.posts.c.author).where(tables.posts.c.id == post_id))
+        author = author.fetchone()
+
+        if author is None:
             raise NotFound
 
-        if post["author"] == username:
+        if author.author == username:
             raise AuthorLiked
 
-        insert = sa.insert(tables.likes).values(post=post_id, user=username)
-
-        try:
-            self._connection.execute(insert)
-        except exc.IntegrityError:
-            raise AlreadyLiked
+        raise AlreadyLiked
 
     def unlike(self, post_id: ID, username):
         """Unlike post.
 
+        The like is deleted and its date returned for the daily rollup by a single statement.
+
         Args:
             post_id: unique ID to look for.
             username: user has liked post before.
+        Raises:
+            NotLiked: user has not liked the post, nothing was deleted.
         """
-        if not self.has_like(post_id, username):
+        deleted = self._delete_like(post_id, username)
+
+        if deleted is None:
             raise NotLiked
 
-        delete = sa.delete(tables.likes).where(tables.likes.c.post == post_id and tables.likes.c.user == username)
-        self._connection.execute(delete)
+        self._count_likes({post_id: -1}, {deleted.date: -1})
+
+    def apply_likes(self, username: str, reqs: Sequence[LikeRequest]) -> list[LikeResult]:
+        """Like and unlike many posts at once.
+
+        Posts are read with a single query, then every request is written on its own with
+        conflicts ignored, so a failed request does not affect the others and results reflect the rows actually
+        inserted or deleted even when the same likes are changed concurrently. Like counts are updated in bulk.
+
+        Args:
+            username: liking user.
+            reqs: like and unlike requests.
+        Returns:
+            Result of every request in requests order.
+        """
+        likes = tables.likes
+        select = sa.select(tables.posts.c.id, tables.posts.c.author)
+        select = select.where(tables.posts.c.id.in_({req.post_id for req in reqs}))
+        found = {row.id: row for row in self._connection.execute(select)}
+        today = datetime.datetime.utcnow().date()
+        insert = sqlite.insert(likes).on_conflict_do_nothing(index_elements=[likes.c.user, likes.c.post])
+        post_deltas: dict[ID, int] = collections.Counter()
+        daily_deltas: dict[datetime.date, int] = collections.Counter()
+        results = []
+
+        for req in reqs:
+            if req.post_id not in found:
+                results.append(LikeResult.NOT_FOUND)
+            elif req.action is LikeAction.LIKE and found[req.post_id].author == username:
+                results.append(LikeResult.AUTHOR_LIKED)
+            elif req.action is LikeAction.LIKE:
+                values = {"post": req.post_id, "user": username, "date": today}
+                inserted = self._connection.execute(insert, values).rowcount
+
+                if inserted:
+                    post_deltas[req.post_id] += 1
+                    daily_deltas[today] += 1
+
+                results.append(LikeResult.OK if inserted else LikeResult.ALREADY_LIKED)
+            else:
+                deleted = self._delete_like(req.post_id, username)
+
+                if deleted is not None:
+                    post_deltas[req.post_id] -= 1
+                    daily_deltas[deleted.date or today] -= 1
+
+                results.append(LikeResult.NOT_LIKED if deleted is None else LikeResult.OK)
+
+        self._count_likes(post_deltas, daily_deltas)
+        return results
+
+    def export_posts(self, start: ID | None = None, end: ID | None = None, batch_size: int = 1000) -> Iterator[dict]:
+        """Stream posts in ID order.
+
+        Rows are fetched in batches while iterating, so memory use does not grow with the number of posts.
+
+        Args:
+            start: first exported post ID.
+            end: last exported post ID.
+            batch_size: number of rows fetched at once.
+        Returns:
+            Posts in the ID range.
+        """
+        result = self._connection.execute(_export_posts(start, end).execution_options(yield_per=batch_size))
+        return (dict(row) for row in result)
+
+    def export_likes(
+        self, start: datetime.date | None = None, end: datetime.date | None = None, batch_size: int = 1000
+    ) -> Iterator[dict]:
+        """Stream likes in date order.
+
+        Rows are fetched in batches while iterating, so memory use does not grow with the number of likes.
+
+        Args:
+            start: first exported date.
+            end: last exported date.
+            batch_size: number of rows fetched at once.
+        Returns:
+            Likes made in the date range.
+        """
+        result = self._connection.execute(_export_likes(start, end).execution_options(yield_per=batch_size))
+        return (dict(row) for row in result)
+
+    def recount_likes(self) -> int:
+        """Recount likes of every post.
+
+        Repairs denormalized posts like counts after the likes were changed bypassing the catalog.
+
+        Returns:
+            Number of posts with changed like count.
+        """
+        count = sa.select(sa.func.count()).where(tables.likes.c.post == tables.posts.c.id).scalar_subquery()
+        update = sa.update(tables.posts).where(tables.posts.c.like_count != count).values(like_count=count)
+        return self._connection.execute(update).rowcount
+
+    def rebuild_daily_likes(self) -> int:
+        """Rebuild daily likes rollup backing analytics from the likes.
+
+        Returns:
+            Number of days with likes.
+        """
+        date = sa.func.date(tables.likes.c.date)
+        select = sa.select(date, sa.func.count()).group_by(date)
+        self._connection.execute(sa.delete(tables.likes_daily))
+        insert = sa.insert(tables.likes_daily).from_select(["date", "likes"], select)
+        days = self._connection.execute(insert).rowcount
+
+        if self._analytics_cache is not None:
+            self._invalidate(self._analytics_cache.clear)
+
+        return days
 
     def analytics(self, start: datetime.date | None = None, end: datetime.date | None = None) -> int:
         """Get aggregated likes count.
 
+        Results are cached when the catalog has analytics cache, ranges ending in the past live for
+        `ANALYTICS_CLOSED_TTL` seconds as only unlikes change them. Ranges with changed days are dropped on the change
+        and again once its transaction ends, so no value read by a concurrent transaction before the commit survives
+        it. Invalidation is local to the process, so the finite lifetime bounds how long other processes serve ranges
+        changed by an unlike.
+
         Args:
             start: start date of aggregating.
             end: end date of aggregating.
         Returns:
             Number of likes made in given period.
         """
+        if self._analytics_cache is None:
+            return self._sum_daily_likes(start, end)
+
+        likes = self._analytics_cache.get((start, end))
+
+        if likes is None:
+            likes = self._sum_daily_likes(start, end)
+            closed = end is not None and end < datetime.datetime.utcnow().date()
+            self._analytics_cache.set((start, end), likes, ANALYTICS_CLOSED_TTL if closed else None)
+
+        return likes
+
+    def analytics_series(
+        self,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        bucket: Bucket = Bucket.DAY,
+        max_buckets: int | None = None,
+    ) -> list[tuple[datetime.date, int]]:
+        """Get likes count time series.
+
+        Args:
+            start: start date of aggregating.
+            end: end date of aggregating.
+            bucket: size of aggregated periods.
+            max_buckets: maximum number of periods in the series, unlimited if not given.
+        Returns:
+            Start date of every period in the range with number of likes made in it, periods without likes included.
+        Raises:
+            TooManyBuckets: the range spans more than `max_buckets` periods.
+        """
+        filters = []
+        date_col = tables.likes_daily.c.date
+
+        if start is not None:
+            filters.append(start <= date_col)
+
+        if end is not None:
+            filters.append(date_col <= end)
+
+        if bucket is Bucket.WEEK:
+            bucket_col = sa.func.date(date_col, "weekday 0", "-6 days", type_=sa.Date)
+        elif bucket is Bucket.MONTH:
+            bucket_col = sa.func.strftime("%Y-%m-01", date_col, type_=sa.Date)
+        else:
+            bucket_col = date_col
+
+        select = sa.select(bucket_col, sa.func.sum(tables.likes_daily.c.likes)).where(*filters).group_by(bucket_col)
+        likes = dict(self._connection.execute(select).all())
+
+        if start is None and end is None and not likes:
+            return []
+
+        date = bucket.start(start or min(likes, default=end))
+        last = bucket.start(end or max(likes, default=start))
+
+        if max_buckets is not None and bucket.count(date, last) > max_buckets:
+            raise TooManyBuckets
+
+        series = []
+
+        while date <= last:
+            series.append((date, likes.get(date, 0)))
+
+            if date == last:
+                break
+
+            date = bucket.next(date)
+
+        return series
+
+    def _sum_daily_likes(self, start: datetime.date | None, end: datetime.date | None) -> int:
         filters = []
-        date_col = tables.likes.c.date
+        date_col = tables.likes_daily.c.date
 
         if start is not None:
             filters.append(start <= date_col)
@@ -143,5 +538,194 @@ class Catalog:
         if end is not None:
             filters.append(date_col <= end)
 
-        select = sa.select(sa.func.count()).select_from(tables.likes).where(*filters)
+        select = sa.select(sa.func.coalesce(sa.func.sum(tables.likes_daily.c.likes), 0)).where(*filters)
         return self._connection.execute(select).scalar()
+
+    def _delete_like(self, post_id: ID, username: str) -> Optional[sa.engine.Row]:
+        delete = sa.text('DELETE FROM likes WHERE post = :post AND "user" = :user RETURNING date(date) AS date')
+        delete = delete.columns(sa.column("date", sa.Date))
+        return self._connection.execute(delete, {"post": post_id, "user": username}).first()
+
+    def _count_likes(self, post_deltas: dict[ID, int], daily_deltas: dict[datetime.date, int]):
+        post_deltas = {post_id: delta for post_id, delta in post_deltas.items() if delta}
+        daily_deltas = {date: delta for date, delta in daily_deltas.items() if delta}
+
+        if post_deltas:
+            update = (
+                sa.update(tables.posts)
+                .where(tables.posts.c.id == sa.bindparam("b_id"))
+                .values(like_count=tables.posts.c.like_count + sa.bindparam("b_delta"))
+            )
+            self._connection.execute(update, [{"b_id": i, "b_delta": d} for i, d in post_deltas.items()])
+
+        if daily_deltas:
+            daily = sqlite.insert(tables.likes_daily)
+            daily = daily.on_conflict_do_update(
+                index_elements=[tables.likes_daily.c.date],
+                set_={"likes": tables.likes_daily.c.likes + daily.excluded.likes},
+            )
+            self._connection.execute(daily, [{"date": date, "likes": delta} for date, delta in daily_deltas.items()])
+
+            if self._analytics_cache is not None:
+                self._invalidate(functools.partial(self._analytics_cache.invalidate, _covering(daily_deltas)))
+
+    def _read(self, post_id: ID, username: str | None) -> Optional[dict]:
+        cached = None if self._post_cache is None else self._post_cache.get(post_id)
+
+        if username is None:
+            liked = sa.false()
+        else:
+            liked = sa.exists().where(tables.likes.c.post == tables.posts.c.id, tables.likes.c.user == username)
+
+        content = [] if cached is not None else [tables.posts.c[name] for name in _POST_CONTENT]
+        select = sa.select(*content, tables.posts.c.like_count, liked.label("liked"))
+        result = self._connection.execute(select.where(tables.posts.c.id == post_id)).fetchone()
+
+        if not result:
+            return None
+
+        post = dict(result) | {"liked": bool(result.liked)}
+
+        if cached is not None:
+            return cached | post
+
+        if self._post_cache is not None:
+            self._post_cache.set(post_id, {name: post[name] for name in _POST_CONTENT})
+
+        return post
+
+    def _invalidate(self, invalidate: Callable[[], Any]):
+        invalidate()
+        tables.after_transaction(self._connection, invalidate)
+
+
+def _export_posts(start: ID | None, end: ID | None) -> sa.sql.Select:
+    select = sa.select(tables.posts).order_by(tables.posts.c.id)
+
+    if start is not None:
+        select = select.where(tables.posts.c.id >= start)
+
+    if end is not None:
+        select = select.where(tables.posts.c.id <= end)
+
+    return select
+
+
+def _export_likes(start: datetime.date | None, end: datetime.date | None) -> sa.sql.Select:
+    likes = tables.likes
+    select = sa.select(likes.c.user, likes.c.post, sa.func.date(likes.c.date, type_=sa.Date).label("date"))
+    select = select.order_by(likes.c.date)
+
+    if start is not None:
+        select = select.where(likes.c.date >= start)
+
+    if end is not None:
+        select = select.where(likes.c.date < end + datetime.timedelta(days=1))
+
+    return select
+
+
+def _covering(dates: Iterable[datetime.date]) -> Callable[[tuple, Any], bool]:
+    return lambda key, _: any(_in_range(date, *key) for date in dates)
+
+
+def _in_range(date: datetime.date, start: datetime.date | None, end: datetime.date | None) -> bool:
+    return (start is None or start <= date) and (end is None or date <= end)
+
+
+class AsyncCatalog:
+    """Catalog of users posts over an asyncio connection.
+
+    Runs the `Catalog` queries through the connection greenlet bridge, so both catalogs share the same SQL.
+    """
+
+    def __init__(
+        self,
+        connection: asyncio.AsyncConnection,
+        analytics_cache: cache.Cache | None = None,
+        post_cache: cache.Cache | None = None,
+    ):
+        self._connection = connection
+        self._analytics_cache = analytics_cache
+        self._post_cache = post_cache
+
+    async def make_post(self, author: str, req: MakePostRequest) -> ID:
+        """Make a new post, see `Catalog.make_post`."""
+        return await self._run(Catalog.make_post, author, req)
+
+    async def make_posts(self, author: str, reqs: Sequence[MakePostRequest]) -> list[ID]:
+        """Make new posts in bulk, see `Catalog.make_posts`."""
+        return await self._run(Catalog.make_posts, author, reqs)
+
+    async def get(self, post_id: ID) -> Optional[dict]:
+        """Get post from catalog, see `Catalog.get`."""
+        return await self._run(Catalog.get, post_id)
+
+    async def get_for_viewer(self, post_id: ID, username: str | None) -> Optional[dict]:
+        """Get post from catalog together with the viewer like, see `Catalog.get_for_viewer`."""
+        return await self._run(Catalog.get_for_viewer, post_id, username)
+
+    async def list(self, after: ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts in ID order, see `Catalog.list`."""
+        return await self._run(Catalog.list, after, limit)
+
+    async def list_by_author(self, author: str, before: ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts of the author, see `Catalog.list_by_author`."""
+        return await self._run(Catalog.list_by_author, author, before, limit)
+
+    async def has_like(self, post_id: ID, username: str) -> bool:
+        """Check whether the user has liked the post, see `Catalog.has_like`."""
+        return await self._run(Catalog.has_like, post_id, username)
+
+    async def has_likes(self, post_ids: Iterable[ID], username: str) -> dict[ID, bool]:
+        """Check whether the user has liked each of the posts, see `Catalog.has_likes`."""
+        return await self._run(Catalog.has_likes, list(post_ids), username)
+
+    async def apply_likes(self, username: str, reqs: Sequence[LikeRequest]) -> list[LikeResult]:
+        """Like and unlike many posts at once, see `Catalog.apply_likes`."""
+        return await self._run(Catalog.apply_likes, username, reqs)
+
+    async def like(self, post_id: ID, username: str):
+        """Like post, see `Catalog.like`."""
+        await self._run(Catalog.like, post_id, username)
+
+    async def unlike(self, post_id: ID, username: str):
+        """Unlike post, see `Catalog.unlike`."""
+        await self._run(Catalog.unlike, post_id, username)
+
+    async def analytics(self, start: datetime.date | None = None, end: datetime.date | None = None) -> int:
+        """Get aggregated likes count, see `Catalog.analytics`."""
+        return await self._run(Catalog.analytics, start, end)
+
+    async def analytics_series(
+        self,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        bucket: Bucket = Bucket.DAY,
+        max_buckets: int | None = None,
+    ) -> list[tuple[datetime.date, int]]:
+        """Get likes count time series, see `Catalog.analytics_series`."""
+        return await self._run(Catalog.analytics_series, start, end, bucket, max_buckets)
+
+    async def export_posts(
+        self, start: ID | None = None, end: ID | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Stream posts in ID order from a server-side cursor, see `Catalog.export_posts`."""
+        result = await self._connection.stream(_export_posts(start, end).execution_options(yield_per=batch_size))
+
+        async for row in result:
+            yield dict(row)
+
+    async def export_likes(
+        self, start: datetime.date | None = None, end: datetime.date | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Stream likes in date order from a server-side cursor, see `Catalog.export_likes`."""
+        result = await self._connection.stream(_export_likes(start, end).execution_options(yield_per=batch_size))
+
+        async for row in result:
+            yield dict(row)
+
+    async def _run(self, method: Callable[..., Any], *args) -> Any:
+        return await self._connection.run_sync(
+            lambda connection: method(Catalog(connection, self._analytics_cache, self._post_cache), *args)
+        )
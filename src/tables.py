@@ -1,10 +1,131 @@
+import os
+from typing import Any, Callable
+
 import sqlalchemy as sa
 from sqlalchemy import pool
+from sqlalchemy.ext import asyncio
 
 
-engine = sa.create_engine(
-    "sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False}, poolclass=pool.StaticPool
-)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+pysqlite:///posts.db")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "40"))
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+_AFTER_TRANSACTION = "after_transaction"
+
+
+def create_engine(url: str = DATABASE_URL, pool_size: int = DATABASE_POOL_SIZE) -> sa.engine.Engine:
+    """Create SQLite engine with tuned connection pragmas.
+
+    In-memory databases share a single connection, file databases get a pool sized for the web workers threads
+    and WAL journaling so readers do not wait for writers.
+
+    Args:
+        url: database URL.
+        pool_size: number of persistent connections kept by the pool.
+    Returns:
+        Configured engine.
+    """
+    memory = _is_memory(url)
+
+    if memory:
+        options = {"poolclass": pool.StaticPool}
+    else:
+        options = {"poolclass": pool.QueuePool, "pool_size": pool_size, "max_overflow": pool_size}
+
+    engine_ = sa.create_engine(url, future=True, connect_args={"check_same_thread": False}, **options)
+    sa.event.listen(engine_, "connect", _pragmas(memory))
+    return engine_
+
+
+def create_async_engine(url: str = DATABASE_URL, pool_size: int = DATABASE_POOL_SIZE) -> asyncio.AsyncEngine:
+    """Create asyncio SQLite engine with tuned connection pragmas.
+
+    Same database and settings as `create_engine`, but connecting through aiosqlite.
+
+    Args:
+        url: database URL, its driver is replaced with aiosqlite.
+        pool_size: number of persistent connections kept by the pool.
+    Returns:
+        Configured asyncio engine.
+    """
+    url_ = sa.engine.make_url(url).set(drivername="sqlite+aiosqlite")
+    memory = _is_memory(url_)
+
+    if memory:
+        options = {"poolclass": pool.StaticPool}
+    else:
+        options = {"poolclass": pool.AsyncAdaptedQueuePool, "pool_size": pool_size, "max_overflow": pool_size}
+
+    engine_ = asyncio.create_async_engine(url_, **options)
+    sa.event.listen(engine_.sync_engine, "connect", _pragmas(memory))
+    return engine_
+
+
+def after_transaction(connection: sa.engine.Connection, callback: Callable[[], Any]):
+    """Run callback once the connection transaction ends.
+
+    Callbacks run from `run_after_transaction`, or at the latest when the connection is returned to the pool. Its
+    transaction is committed or rolled back by then, so concurrent readers can not see the state before it anymore,
+    which makes it the place for invalidating caches of changed rows.
+
+    Args:
+        connection: connection in a transaction.
+        callback: called without arguments.
+    """
+    connection.info.setdefault(_AFTER_TRANSACTION, []).append(callback)
+
+
+def run_after_transaction(connection: sa.engine.Connection):
+    """Run callbacks registered by `after_transaction` right after the connection transaction was ended.
+
+    Args:
+        connection: connection out of a transaction, which stays open.
+    """
+    _run_callbacks(connection.info)
+
+
+def _is_memory(url: str | sa.engine.URL) -> bool:
+    return sa.engine.make_url(url).database in (None, "", ":memory:")
+
+
+def _pragmas(memory: bool):
+    pragmas = {
+        "busy_timeout": SQLITE_BUSY_TIMEOUT,
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "cache_size": SQLITE_CACHE_SIZE,
+        "temp_store": SQLITE_TEMP_STORE,
+    }
+
+    if not memory:
+        pragmas |= {"journal_mode": "WAL", "mmap_size": SQLITE_MMAP_SIZE}
+
+    def on_connect(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+        cursor.close()
+
+    return on_connect
+
+
+def _run_after_transaction(_, connection_record):
+    if connection_record is not None:
+        _run_callbacks(connection_record.info)
+
+
+def _run_callbacks(info: dict):
+    for callback in info.pop(_AFTER_TRANSACTION, []):
+        callback()
+
+
+sa.event.listen(pool.Pool, "checkin", _run_after_transaction)
+engine = create_engine()
+async_engine = create_async_engine()
 metadata = sa.MetaData()
 users = sa.Table(
     "users",
@@ -22,13 +143,37 @@ posts = sa.Table(
     sa.Column("author", None, sa.ForeignKey("users.username")),
     sa.Column("title", sa.String, nullable=False),
     sa.Column("description", sa.String, nullable=False),
+    sa.Column("like_count", sa.Integer, nullable=False, server_default="0"),
 )
+sa.Index("ix_posts_author_id_desc", posts.c.author, posts.c.id.desc())
 likes = sa.Table(
     "likes",
     metadata,
     sa.Column("user", None, sa.ForeignKey("users.username")),
     sa.Column("post", None, sa.ForeignKey("posts.id")),
-    sa.Column("date", sa.Date, server_default=sa.func.now()),
+    sa.Column("date", sa.Date, server_default=sa.func.current_date()),
     sa.UniqueConstraint("user", "post"),
+    sa.Index("ix_likes_date", "date"),
+    sa.Index("ix_likes_post_user", "post", "user"),
+    sa.Index("ix_likes_user", "user"),
+)
+refresh_tokens = sa.Table(
+    "refresh_tokens",
+    metadata,
+    sa.Column("digest", sa.LargeBinary, primary_key=True),
+    sa.Column("username", None, sa.ForeignKey("users.username"), nullable=False),
+    sa.Column("expires", sa.DateTime, nullable=False),
+    sa.Index("ix_refresh_tokens_username", "username"),
+)
+likes_daily = sa.Table(
+    "likes_daily",
+    metadata,
+    sa.Column("date", sa.Date, primary_key=True),
+    sa.Column("likes", sa.Integer, nullable=False, server_default="0"),
+)
+schema_versions = sa.Table(
+    "schema_versions",
+    metadata,
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("applied", sa.DateTime, server_default=sa.func.now()),
 )
-metadata.create_all(engine)
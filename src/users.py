@@ -1,21 +1,30 @@
 """Users module."""
 
 
+import asyncio
 import datetime
 import hashlib
 import os
+import secrets
+import threading
+import time
+from typing import Any, Callable, Optional
 
 from jose import jwt
 import sqlalchemy as sa
 from sqlalchemy import exc
 from sqlalchemy.engine import base
+from sqlalchemy.ext import asyncio as sa_asyncio
 
+import cache
+import hashing
 import tables
 
 
 SECRET_KEY = os.getenv("SECRET_KEY", "b95b59f177585138466f60dcade5c26b1710b3714ce1c9d1613af584c4591b8a")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_LIFETIME = 2 * 60
+REFRESH_TOKEN_LIFETIME = int(os.getenv("REFRESH_TOKEN_LIFETIME", str(30 * 24 * 60)))
 
 
 class UserExists(Exception):
@@ -26,91 +35,256 @@ class Unauthorized(Exception):
     """User is unauthorized."""
 
 
+class ActivityBuffer:
+    """Write-behind buffer of users activity.
+
+    Keeps only the latest activity time of every user until they are flushed to the database in bulk.
+    """
+
+    def __init__(self, maxsize: int):
+        """Create buffer.
+
+        Args:
+            maxsize: number of buffered users which should be flushed.
+        """
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pending: dict[str, datetime.datetime] = {}
+
+    def track(self, username: str, time_: datetime.datetime) -> bool:
+        """Buffer user activity.
+
+        Args:
+            username: user login identificator.
+            time_: activity time.
+        Returns:
+            Whether buffer is full and should be flushed.
+        """
+        with self._lock:
+            if username not in self._pending or self._pending[username] < time_:
+                self._pending[username] = time_
+
+            return len(self._pending) >= self._maxsize
+
+    def get(self, username: str) -> Optional[datetime.datetime]:
+        """Get buffered user activity time.
+
+        Args:
+            username: user login identificator.
+        Returns:
+            Latest not flushed activity time.
+        """
+        with self._lock:
+            return self._pending.get(username)
+
+    def flush(self, connection: base.Connection) -> int:
+        """Write buffered activities to the database.
+
+        Activities are put back to the buffer if writing fails.
+
+        Args:
+            connection: database connection.
+        Returns:
+            Number of flushed users activities.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        last_activity = tables.users.c.last_activity
+        update = (
+            sa.update(tables.users)
+            .where(
+                tables.users.c.username == sa.bindparam("b_username"),
+                sa.or_(last_activity.is_(None), last_activity < sa.bindparam("b_last_activity")),
+            )
+            .values(last_activity=sa.bindparam("b_last_activity"))
+        )
+
+        try:
+            connection.execute(update, [{"b_username": u, "b_last_activity": t} for u, t in pending.items()])
+        except Exception:
+            for username, time_ in pending.items():
+                self.track(username, time_)
+            raise
+
+        return len(pending)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
 class Registry:
     """Users registry."""
 
-    def __init__(self, connection: base.Connection):
+    def __init__(
+        self,
+        connection: base.Connection,
+        token_cache: cache.Cache | None = None,
+        activity_buffer: ActivityBuffer | None = None,
+        hasher: hashing.Hasher | None = None,
+    ):
+        """Create registry.
+
+        Args:
+            connection: database connection.
+            token_cache: shared cache of authenticated usernames by token digest.
+            activity_buffer: shared buffer delaying users activity writes.
+            hasher: passwords hasher, the configured one by default.
+        """
         self._connection = connection
+        self._token_cache = token_cache
+        self._activity_buffer = activity_buffer
+        self._hasher = hasher or hashing.configured()
 
     def signup(self, username: str, password: str):
         """Signup new user.
 
-        Saves password as hash with random salt.
+        Saves password as encoded hash with random salt.
 
         Args:
             username: user login identificator.
             password: user auth password.
         """
-        salt = os.urandom(32)
-        password_hash = _hash_password(password, salt)
-        insert = tables.users.insert().values(username=username, password=password_hash, salt=salt)
-        try:
-            self._connection.execute(insert)
-        except exc.IntegrityError:
-            raise UserExists
+        self._add_user(username, self._hasher.hash(password))
 
     def login(self, username: str, password: str) -> str:
         """Login registered user.
 
+        Password hashed with other algorithm or cost than the registry hasher is hashed again.
+
         Args:
             username: user login identificator.
             password: user password to match with the one in registry.
         Returns:
             Access auth JWT token.
         """
-        columns = (tables.users.c.username, tables.users.c.password, tables.users.c.salt)
-        select = sa.select(*columns).where(tables.users.c.username == username)
-        result = self._connection.execute(select).fetchone()
+        password_hash = self._credentials(username)
 
-        if not result:
+        if not hashing.verify(password, password_hash):
             raise Unauthorized
 
-        username, password_hash, salt = result
+        if hashing.needs_rehash(password_hash, self._hasher):
+            self._rehashed(username, self._hasher.hash(password))
 
-        if password_hash != _hash_password(password, salt):
+        return self._logged_in(username)
+
+    def issue_refresh_token(self, username: str) -> str:
+        """Issue long-lived token for getting new access tokens without the password.
+
+        Only the token digest is saved, and expired tokens of the user are dropped.
+
+        Args:
+            username: user login identificator.
+        Returns:
+            Refresh token.
+        """
+        refresh_tokens = tables.refresh_tokens
+        now = datetime.datetime.utcnow()
+        delete = sa.delete(refresh_tokens).where(refresh_tokens.c.username == username, refresh_tokens.c.expires <= now)
+        self._connection.execute(delete)
+
+        token = secrets.token_urlsafe(32)
+        expires = now + datetime.timedelta(minutes=REFRESH_TOKEN_LIFETIME)
+        insert = sa.insert(refresh_tokens).values(digest=_token_digest(token), username=username, expires=expires)
+        self._connection.execute(insert)
+        return token
+
+    def refresh(self, refresh_token: str) -> tuple[str, str]:
+        """Exchange refresh token for new access and refresh tokens.
+
+        Refresh tokens are rotated, so the given one can not be used again.
+
+        Args:
+            refresh_token: token issued on user login or previous refresh.
+        Returns:
+            Access auth JWT token and new refresh token.
+        """
+        refresh_tokens = tables.refresh_tokens
+        digest = _token_digest(refresh_token)
+        select = sa.select(refresh_tokens.c.username).where(
+            refresh_tokens.c.digest == digest, refresh_tokens.c.expires > datetime.datetime.utcnow()
+        )
+        username = self._connection.execute(select).scalar()
+
+        if username is None:
             raise Unauthorized
 
-        expires = datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_LIFETIME)
-        update = sa.update(tables.users).where(tables.users.c.username == username).values(last_login=sa.func.now())
-        self._connection.execute(update)
+        if self._connection.execute(sa.delete(refresh_tokens).where(refresh_tokens.c.digest == digest)).rowcount != 1:
+            raise Unauthorized
 
-        return jwt.encode({"sub": username, "exp": expires}, SECRET_KEY, JWT_ALGORITHM)
+        return _access_token(username), self.issue_refresh_token(username)
+
+    def revoke_refresh_token(self, refresh_token: str):
+        """Revoke refresh token, unknown tokens are ignored.
+
+        Args:
+            refresh_token: revoked token.
+        """
+        refresh_tokens = tables.refresh_tokens
+        self._connection.execute(
+            sa.delete(refresh_tokens).where(refresh_tokens.c.digest == _token_digest(refresh_token))
+        )
+
+    def revoke_refresh_tokens(self, username: str):
+        """Revoke all refresh tokens of the user.
+
+        Args:
+            username: user login identificator.
+        """
+        refresh_tokens = tables.refresh_tokens
+        self._connection.execute(sa.delete(refresh_tokens).where(refresh_tokens.c.username == username))
 
     def authenticate(self, token: str) -> str:
         """Authenticate user with a token.
 
+        Verified tokens are cached until they expire when the registry has token cache.
+
         Args:
             token: auth token given on user login.
         Returns:
             Aunthenticated user name.
         """
-        try:
-            payload = jwt.decode(token, SECRET_KEY, JWT_ALGORITHM)
-        except jwt.JWTError:
-            raise Unauthorized
+        username = _cached_username(self._token_cache, token)
 
-        try:
-            username = payload["sub"]
-        except KeyError:
-            raise Unauthorized
+        if username is not None:
+            return username
 
-        select = tables.users.select().where(tables.users.c.username == username)
-        result = self._connection.execute(select).fetchone()
+        return self._verify_token(token)
 
-        if not result:
-            raise Unauthorized
+    def invalidate_tokens(self, username: str):
+        """Drop cached tokens of the user.
 
-        return username
+        Must be called when user is removed, so its tokens stop authenticating.
 
-    def track_activity(self, username: str):
+        Args:
+            username: user login identificator.
+        """
+        if self._token_cache is not None:
+            self._token_cache.invalidate(lambda _, cached: cached == username)
+
+    def track_activity(self, username: str) -> bool:
         """Track user activity.
 
+        Activity is buffered when the registry has activity buffer. A full buffer is not flushed on the registry
+        connection, as rolling back its transaction would lose the activities of all the buffered users, the caller
+        flushes it in a transaction of its own instead.
+
         Args:
             username: user login identificator.
+        Returns:
+            Whether activity buffer is full and should be flushed.
         """
         now = datetime.datetime.utcnow()
+
+        if self._activity_buffer is not None:
+            return self._activity_buffer.track(username, now)
+
         insert = tables.users.update().where(tables.users.c.username == username).values(last_activity=now)
         self._connection.execute(insert)
+        return False
 
     def get_activities(self, username: str) -> tuple[datetime.datetime, datetime.datetime]:
         """Get last user actities tracks.
@@ -126,8 +300,176 @@ class Registry:
         result = self._connection.execute(select).fetchone()
         assert result is not None
 
-        return result.last_login, result.last_activity
+        last_activity = result.last_activity
+        buffered = self._activity_buffer.get(username) if self._activity_buffer is not None else None
+
+        if buffered is not None and (last_activity is None or last_activity < buffered):
+            last_activity = buffered
+
+        return result.last_login, last_activity
+
+    def _add_user(self, username: str, password_hash: str):
+        insert = tables.users.insert().values(username=username, password=password_hash, salt="")
+        try:
+            self._connection.execute(insert)
+        except exc.IntegrityError:
+            raise UserExists
+
+    def _credentials(self, username: str) -> str:
+        select = sa.select(tables.users.c.password, tables.users.c.salt).where(tables.users.c.username == username)
+        result = self._connection.execute(select).fetchone()
+
+        if not result:
+            raise Unauthorized
+
+        if isinstance(result.password, bytes):
+            return hashing.encode_legacy(result.password, result.salt)
+
+        return result.password
+
+    def _rehashed(self, username: str, password_hash: str):
+        update = sa.update(tables.users).where(tables.users.c.username == username)
+        self._connection.execute(update.values(password=password_hash, salt=""))
+
+    def _logged_in(self, username: str) -> str:
+        update = sa.update(tables.users).where(tables.users.c.username == username).values(last_login=sa.func.now())
+        self._connection.execute(update)
+
+        return _access_token(username)
+
+    def _verify_token(self, token: str) -> str:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, JWT_ALGORITHM)
+        except jwt.JWTError:
+            raise Unauthorized
+
+        try:
+            username = payload["sub"]
+        except KeyError:
+            raise Unauthorized
+
+        select = sa.select(tables.users.c.username).where(tables.users.c.username == username)
+        result = self._connection.execute(select).fetchone()
+
+        if not result:
+            raise Unauthorized
+
+        if self._token_cache is not None and "exp" in payload:
+            self._token_cache.set(_token_digest(token), username, payload["exp"] - time.time())
+
+        return username
+
+
+class AsyncRegistry:
+    """Users registry over an asyncio connection.
+
+    Runs the `Registry` queries through the connection greenlet bridge and hashes passwords in the hash pool, or a
+    worker thread without one, so neither blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        connection: sa_asyncio.AsyncConnection,
+        token_cache: cache.Cache | None = None,
+        activity_buffer: ActivityBuffer | None = None,
+        hash_pool: hashing.HashPool | None = None,
+        hasher: hashing.Hasher | None = None,
+    ):
+        self._connection = connection
+        self._token_cache = token_cache
+        self._activity_buffer = activity_buffer
+        self._hash_pool = hash_pool
+        self._hasher = hasher or hashing.configured()
+
+    async def signup(self, username: str, password: str):
+        """Signup new user, see `Registry.signup`."""
+        password_hash = await self._hash(password)
+        await self._run(Registry._add_user, username, password_hash)
+
+    async def login(self, username: str, password: str) -> str:
+        """Login registered user, see `Registry.login`."""
+        password_hash = await self._run(Registry._credentials, username)
+
+        if not await self._verify(password, password_hash):
+            raise Unauthorized
+
+        if hashing.needs_rehash(password_hash, self._hasher):
+            await self._run(Registry._rehashed, username, await self._hash(password))
+
+        return await self._run(Registry._logged_in, username)
+
+    async def issue_refresh_token(self, username: str) -> str:
+        """Issue long-lived token for getting new access tokens, see `Registry.issue_refresh_token`."""
+        return await self._run(Registry.issue_refresh_token, username)
+
+    async def refresh(self, refresh_token: str) -> tuple[str, str]:
+        """Exchange refresh token for new access and refresh tokens, see `Registry.refresh`."""
+        return await self._run(Registry.refresh, refresh_token)
+
+    async def revoke_refresh_token(self, refresh_token: str):
+        """Revoke refresh token, see `Registry.revoke_refresh_token`."""
+        await self._run(Registry.revoke_refresh_token, refresh_token)
+
+    async def revoke_refresh_tokens(self, username: str):
+        """Revoke all refresh tokens of the user, see `Registry.revoke_refresh_tokens`."""
+        await self._run(Registry.revoke_refresh_tokens, username)
+
+    async def authenticate(self, token: str) -> str:
+        """Authenticate user with a token, see `Registry.authenticate`."""
+        username = _cached_username(self._token_cache, token)
+
+        if username is not None:
+            return username
+
+        return await self._run(Registry._verify_token, token)
+
+    def invalidate_tokens(self, username: str):
+        """Drop cached tokens of the user, see `Registry.invalidate_tokens`."""
+        if self._token_cache is not None:
+            self._token_cache.invalidate(lambda _, cached: cached == username)
+
+    async def track_activity(self, username: str) -> bool:
+        """Track user activity, see `Registry.track_activity`."""
+        if self._activity_buffer is None:
+            return await self._run(Registry.track_activity, username)
+
+        return self._activity_buffer.track(username, datetime.datetime.utcnow())
+
+    async def get_activities(self, username: str) -> tuple[datetime.datetime, datetime.datetime]:
+        """Get last user actities tracks, see `Registry.get_activities`."""
+        return await self._run(Registry.get_activities, username)
+
+    async def _hash(self, password: str) -> str:
+        if self._hash_pool is None:
+            return await asyncio.to_thread(self._hasher.hash, password)
+
+        return await self._hash_pool.hash(self._hasher, password)
+
+    async def _verify(self, password: str, password_hash: str) -> bool:
+        if self._hash_pool is None:
+            return await asyncio.to_thread(hashing.verify, password, password_hash)
+
+        return await self._hash_pool.verify(password, password_hash)
+
+    async def _run(self, method: Callable[..., Any], *args) -> Any:
+        return await self._connection.run_sync(
+            lambda connection: method(
+                Registry(connection, self._token_cache, self._activity_buffer, self._hasher), *args
+            )
+        )
+
+
+def _access_token(username: str) -> str:
+    expires = datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_LIFETIME)
+    return jwt.encode({"sub": username, "exp": expires}, SECRET_KEY, JWT_ALGORITHM)
+
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
 
+def _cached_username(token_cache: cache.Cache | None, token: str) -> Optional[str]:
+    if token_cache is None:
+        return None
 
-def _hash_password(password: str, salt: bytes) -> bytes:
-    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100000, 128)
+    return token_cache.get(_token_digest(token))
@@ -2,5 +2,6 @@
 
 
 from web.app import create_app
+from web.database import connection
 from web.posts import catalog
 from web.users import registry
@@ -2,19 +2,44 @@
 
 
 import datetime
+import os
+
 import fastapi
 
 import posts
-from web import posts as web_posts
+from web import database, posts as web_posts, users
+
 
+ANALYTICS_MAX_BUCKETS = int(os.getenv("ANALYTICS_MAX_BUCKETS", "3660"))
 
-router = fastapi.APIRouter(prefix="/analytics", tags=["analytics"])
+router = fastapi.APIRouter(prefix="/analytics", tags=["analytics"], route_class=database.Route)
 
 
 @router.get("")
-def get_analytics(
+async def get_analytics(
+    date_from: datetime.date | None = fastapi.Query(None),
+    date_to: datetime.date | None = fastapi.Query(None),
+    group_by: posts.Bucket | None = fastapi.Query(None),
+    catalog: posts.AsyncCatalog = fastapi.Depends(web_posts.catalog),
+):
+    if group_by is None:
+        return {"likes": await catalog.analytics(date_from, date_to)}
+
+    try:
+        series = await catalog.analytics_series(date_from, date_to, group_by, ANALYTICS_MAX_BUCKETS)
+    except posts.TooManyBuckets:
+        raise fastapi.HTTPException(
+            fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY,
+            f"At most {ANALYTICS_MAX_BUCKETS} periods can be grouped at once",
+        )
+
+    return {"likes": sum(likes for _, likes in series), "series": [{"date": d, "likes": n} for d, n in series]}
+
+
+@router.get("/likes/export", dependencies=[fastapi.Depends(users.admin_user)])
+async def export_likes(
     date_from: datetime.date | None = fastapi.Query(None),
     date_to: datetime.date | None = fastapi.Query(None),
-    catalog: posts.Catalog = fastapi.Depends(web_posts.catalog),
+    catalog: posts.AsyncCatalog = fastapi.Depends(web_posts.catalog),
 ):
-    return {"likes": catalog.analytics(date_from, date_to)}
+    return web_posts.ndjson(catalog.export_likes(date_from, date_to, web_posts.EXPORT_BATCH_SIZE))
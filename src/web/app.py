@@ -3,12 +3,17 @@
 
 import fastapi
 
-from web import analytics, posts, users
+from web import analytics, database, metrics, posts, users
 
 
 def create_app() -> fastapi.FastAPI:
-    app = fastapi.FastAPI()
+    app = fastapi.FastAPI(
+        on_startup=[database.migrate, users.start_activity_flushing],
+        on_shutdown=[users.stop_activity_flushing, users.stop_hash_pool, database.dispose],
+    )
     app.include_router(users.router)
     app.include_router(posts.router)
+    app.include_router(posts.authors_router)
     app.include_router(analytics.router)
+    app.include_router(metrics.router)
     return app
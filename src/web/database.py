@@ -0,0 +1,72 @@
+"""Database web dependencies."""
+
+
+from typing import Any, AsyncGenerator, Callable, Coroutine
+
+import fastapi
+from fastapi import routing
+from sqlalchemy.ext import asyncio
+
+import migrations
+import tables
+
+
+class Route(routing.APIRoute):
+    """Route ending the request transaction before its response is sent.
+
+    FastAPI exits dependencies only after the response is sent, so a transaction committed there could still fail
+    after the client got a success, and the client could read before its own writes are visible. Callbacks registered
+    by `tables.after_transaction`, e.g. caches invalidation, run right after the transaction ends as well.
+    """
+
+    def get_route_handler(self) -> Callable[[fastapi.Request], Coroutine[Any, Any, fastapi.Response]]:
+        handler = super().get_route_handler()
+
+        async def handle(request: fastapi.Request) -> fastapi.Response:
+            try:
+                response = await handler(request)
+            except Exception:
+                await _end_transaction(request, commit=False)
+                raise
+
+            await _end_transaction(request, commit=response.status_code < 400)
+            return response
+
+        return handle
+
+
+async def connection(request: fastapi.Request) -> AsyncGenerator[asyncio.AsyncConnection, None]:
+    """Dependency for a request scoped database connection.
+
+    The whole request runs in one transaction which `Route` commits before the response is sent when the request
+    succeeds, and rolls back when it fails or responds with an error status. The connection is returned to the pool
+    after the response is sent, so streamed responses can still read from it.
+    """
+    async with tables.async_engine.connect() as connection_:
+        request.state.connection = connection_
+        yield connection_
+
+
+async def migrate():
+    """Bring database schema up to date on application startup."""
+    async with tables.async_engine.begin() as connection_:
+        await connection_.run_sync(migrations.migrate)
+
+
+async def dispose():
+    """Close pooled database connections on application shutdown."""
+    await tables.async_engine.dispose()
+
+
+async def _end_transaction(request: fastapi.Request, commit: bool):
+    connection_: asyncio.AsyncConnection | None = getattr(request.state, "connection", None)
+
+    if connection_ is None or not connection_.in_transaction():
+        return
+
+    if commit:
+        await connection_.commit()
+    else:
+        await connection_.rollback()
+
+    await connection_.run_sync(tables.run_after_transaction)
@@ -0,0 +1,30 @@
+"""Service metrics web REST API."""
+
+
+import dataclasses
+
+import fastapi
+
+from web import posts, users
+
+
+router = fastapi.APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics():
+    return {
+        "analytics_cache": dataclasses.asdict(posts.analytics_cache.stats),
+        "post_cache": {
+            **dataclasses.asdict(posts.post_cache.stats),
+            "entries": len(posts.post_cache),
+            "bytes": posts.post_cache.nbytes,
+        },
+        "token_cache": dataclasses.asdict(users.token_cache.stats),
+        "password_hashing": {
+            "pending": users.hash_pool.pending,
+            "rejected": users.hash_pool.rejected,
+            "queue_time": dataclasses.asdict(users.hash_pool.queue_time),
+            "hash_time": dataclasses.asdict(users.hash_pool.hash_time),
+        },
+    }
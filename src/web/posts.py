@@ -3,12 +3,31 @@
 
 from __future__ import annotations
 
+import json
+import os
+from typing import AsyncIterator
+from urllib import parse
+
 import fastapi
+from fastapi import responses
 import pydantic
+from sqlalchemy.ext import asyncio
 
+import cache
 import posts
-import tables
-from web import users
+from web import database, users
+
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "1024"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "5"))
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", "10000"))
+POST_CACHE_BYTES = int(os.getenv("POST_CACHE_BYTES", str(64 * 1024 * 1024)))
+POST_CACHE_TTL = float(os.getenv("POST_CACHE_TTL", "60"))
+POST_MAX_AGE = int(os.getenv("POST_MAX_AGE", "5"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+PAGE_SIZE = int(os.getenv("POSTS_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("POSTS_MAX_PAGE_SIZE", "100"))
+MAX_BATCH_SIZE = int(os.getenv("POSTS_MAX_BATCH_SIZE", "1000"))
 
 
 class Link(pydantic.BaseModel):
@@ -26,62 +45,134 @@ class PostResponse(pydantic.BaseModel):
     author: str
     title: str
     description: str
+    like_count: int
+    links: list[Link] = pydantic.Field(default_factory=list)
+
+
+class PostsPageResponse(pydantic.BaseModel):
+    """Response model for listing posts page by page."""
+
+    posts: list[PostResponse]
     links: list[Link] = pydantic.Field(default_factory=list)
 
 
-router = fastapi.APIRouter(prefix="/posts", tags=["posts"], dependencies=[fastapi.Depends(users.track_activity)])
+analytics_cache = cache.Cache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL)
+post_cache = cache.Cache(POST_CACHE_SIZE, POST_CACHE_TTL, maxbytes=POST_CACHE_BYTES)
+router = fastapi.APIRouter(
+    prefix="/posts",
+    tags=["posts"],
+    dependencies=[fastapi.Depends(users.track_activity)],
+    route_class=database.Route,
+)
+authors_router = fastapi.APIRouter(
+    prefix="/users",
+    tags=["posts"],
+    dependencies=[fastapi.Depends(users.track_activity)],
+    route_class=database.Route,
+)
 
 
-async def catalog() -> posts.Catalog:
-    connection = tables.engine.connect()
-    return posts.Catalog(connection)
+async def catalog(connection: asyncio.AsyncConnection = fastapi.Depends(database.connection)) -> posts.AsyncCatalog:
+    return posts.AsyncCatalog(connection, analytics_cache, post_cache)
 
 
 @router.post("", status_code=201)
-def create_post(
+async def create_post(
     req: posts.MakePostRequest,
     response: fastapi.Response,
-    catalog: posts.Catalog = fastapi.Depends(catalog),
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
     username: str = fastapi.Depends(users.current_user),
 ):
-    post_id = catalog.make_post(username, req)
+    post_id = await catalog.make_post(username, req)
     response.headers["location"] = f"/posts/{post_id}"
 
 
+@router.post("/batch", status_code=201)
+async def create_posts(
+    reqs: list[posts.MakePostRequest],
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
+    username: str = fastapi.Depends(users.current_user),
+):
+    if len(reqs) > MAX_BATCH_SIZE:
+        raise fastapi.HTTPException(
+            fastapi.status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_SIZE} posts can be made at once"
+        )
+
+    post_ids = await catalog.make_posts(username, reqs)
+    return {"posts": [{"id": post_id, "location": f"/posts/{post_id}"} for post_id in post_ids]}
+
+
+@router.post("/likes/batch")
+async def apply_likes(
+    reqs: list[posts.LikeRequest],
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
+    username: str = fastapi.Depends(users.current_user),
+):
+    if len(reqs) > MAX_BATCH_SIZE:
+        raise fastapi.HTTPException(
+            fastapi.status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_SIZE} likes can be applied at once"
+        )
+
+    results = await catalog.apply_likes(username, reqs)
+    return {"results": [{"post_id": req.post_id, "result": result} for req, result in zip(reqs, results)]}
+
+
+@router.get("", response_model=PostsPageResponse)
+async def list_posts(
+    after: posts.ID | None = None,
+    limit: int = fastapi.Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
+    username: str = fastapi.Depends(users.optional_user),
+):
+    page = await catalog.list(after, limit + 1)
+    return await _page(catalog, page, limit, username, "/posts", "after")
+
+
+@router.get("/export", dependencies=[fastapi.Depends(users.admin_user)])
+async def export_posts(
+    id_from: posts.ID | None = None,
+    id_to: posts.ID | None = None,
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
+):
+    return ndjson(catalog.export_posts(id_from, id_to, EXPORT_BATCH_SIZE))
+
+
 @router.get("/{post_id}", response_model=PostResponse)
-def get_post(
+async def get_post(
     post_id: posts.ID,
-    catalog: posts.Catalog = fastapi.Depends(catalog),
+    request: fastapi.Request,
+    response: fastapi.Response,
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
     username: str = fastapi.Depends(users.optional_user),
 ):
-    post = catalog.get(post_id)
+    post = await catalog.get_for_viewer(post_id, username)
 
     if post is None:
         raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND)
 
-    links = []
-
-    resp = post | {"links": links}
-
-    if not username or post["author"] == username:
-        return resp
+    liked = post.pop("liked")
+    viewer = username is not None and post["author"] != username
+    headers = {
+        "ETag": _etag(post, liked if viewer else None),
+        "Cache-Control": f"public, max-age={POST_MAX_AGE}" if username is None else "private, no-cache",
+        "Vary": "Authorization",
+    }
 
-    if catalog.has_like(post["id"], username):
-        links.append(_link("unlike", f"/posts/{post_id}/like", "DELETE"))
-    else:
-        links.append(_link("like", f"/posts/{post_id}/like", "POST"))
+    if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    return resp
+    response.headers.update(headers)
+    return post | {"links": _like_links(post_id, liked) if viewer else []}
 
 
 @router.post("/{post_id}/like")
-def like(
+async def like(
     post_id: posts.ID,
-    catalog: posts.Catalog = fastapi.Depends(catalog),
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
     username: str = fastapi.Depends(users.current_user),
 ):
     try:
-        catalog.like(post_id, username)
+        await catalog.like(post_id, username)
     except posts.AlreadyLiked:
         raise fastapi.HTTPException(fastapi.status.HTTP_403_FORBIDDEN, "You already liked this post")
 
@@ -89,18 +180,95 @@ def like(
 
 
 @router.delete("/{post_id}/like", status_code=fastapi.status.HTTP_200_OK)
-def unlike(
+async def unlike(
     post_id: posts.ID,
-    catalog: posts.Catalog = fastapi.Depends(catalog),
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
     username: str = fastapi.Depends(users.current_user),
 ):
     try:
-        catalog.unlike(post_id, username)
+        await catalog.unlike(post_id, username)
     except posts.NotLiked:
         raise fastapi.HTTPException(fastapi.status.HTTP_403_FORBIDDEN, "You did not liked this post")
 
     return {"links": [_link("like", f"/posts/{post_id}/like", "POST")]}
 
 
+@authors_router.get("/{author}/posts", response_model=PostsPageResponse)
+async def list_author_posts(
+    author: str,
+    before: posts.ID | None = None,
+    limit: int = fastapi.Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    catalog: posts.AsyncCatalog = fastapi.Depends(catalog),
+    username: str = fastapi.Depends(users.optional_user),
+):
+    page = await catalog.list_by_author(author, before, limit + 1)
+    return await _page(catalog, page, limit, username, f"/users/{parse.quote(author)}/posts", "before")
+
+
+def ndjson(rows: AsyncIterator[dict]) -> responses.StreamingResponse:
+    """Stream rows as newline delimited JSON.
+
+    Args:
+        rows: streamed rows, dates are written in ISO format.
+    Returns:
+        Response sending rows in chunks of `EXPORT_BATCH_SIZE` lines.
+    """
+
+    async def lines() -> AsyncIterator[str]:
+        chunk = []
+
+        async for row in rows:
+            chunk.append(json.dumps(row, default=str) + "\n")
+
+            if len(chunk) >= EXPORT_BATCH_SIZE:
+                yield "".join(chunk)
+                chunk = []
+
+        if chunk:
+            yield "".join(chunk)
+
+    return responses.StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def _page(
+    catalog: posts.AsyncCatalog, page: list[dict], limit: int, username: str | None, path: str, cursor: str
+) -> dict:
+    posts_, links = page[:limit], []
+
+    if len(page) > limit:
+        query = parse.urlencode({cursor: posts_[-1]["id"], "limit": limit})
+        links.append(_link("next", f"{path}?{query}", "GET"))
+
+    liked = {}
+
+    if username:
+        liked = await catalog.has_likes([p["id"] for p in posts_ if p["author"] != username], username)
+
+    for post in posts_:
+        post["links"] = _like_links(post["id"], liked[post["id"]]) if post["id"] in liked else []
+
+    return {"posts": posts_, "links": links}
+
+
+def _etag(post: dict, liked: bool | None) -> str:
+    state = {None: "none", True: "liked", False: "unliked"}[liked]
+    return f'"{post["id"]}-{post["like_count"]}-{state}"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _like_links(post_id: posts.ID, liked: bool) -> list[dict]:
+    if liked:
+        return [_link("unlike", f"/posts/{post_id}/like", "DELETE")]
+
+    return [_link("like", f"/posts/{post_id}/like", "POST")]
+
+
 def _link(rel: str, href: str, action: str) -> dict:
     return {"rel": rel, "href": href, "action": action}
@@ -1,22 +1,93 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import logging
+import os
+
 import fastapi
 from fastapi import security
 import pydantic
+from sqlalchemy.ext import asyncio as sa_asyncio
 
+import cache
+import hashing
 import tables
 import users
+from web import database
 
 
 USER_EXISTS_ERROR = "User with given username already exists"
+OVERLOADED_ERROR = "Service is busy, try again later"
+ADMIN_USERS = frozenset(filter(None, os.getenv("ADMIN_USERS", "").split(",")))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+ACTIVITY_BUFFER_SIZE = int(os.getenv("ACTIVITY_BUFFER_SIZE", "1000"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+
+logger = logging.getLogger(__name__)
+token_cache = cache.Cache(TOKEN_CACHE_SIZE)
+activity_buffer = users.ActivityBuffer(ACTIVITY_BUFFER_SIZE)
+hash_pool = hashing.HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+_activity_flusher: asyncio.Task | None = None
+_activity_flush: asyncio.Task | None = None
+router = fastapi.APIRouter(prefix="/users", tags=["users"], route_class=database.Route)
+
+
+async def registry(
+    connection: sa_asyncio.AsyncConnection = fastapi.Depends(database.connection),
+) -> users.AsyncRegistry:
+    return users.AsyncRegistry(connection, token_cache, activity_buffer, hash_pool)
+
+
+async def flush_activities():
+    """Write buffered users activities to the database."""
+    async with tables.async_engine.begin() as connection:
+        await connection.run_sync(activity_buffer.flush)
+
+
+def schedule_activity_flush():
+    """Flush buffered users activities in the background, unless a flush is already running.
+
+    The flush runs in a transaction of its own, so failing requests do not roll the activities back.
+    """
+    global _activity_flush
 
+    if _activity_flush is None or _activity_flush.done():
+        _activity_flush = asyncio.create_task(_flush_activities_logged())
 
-router = fastapi.APIRouter(prefix="/users", tags=["users"])
 
+async def start_activity_flushing():
+    """Start flushing buffered users activities periodically on application startup."""
+    global _activity_flusher
 
-async def registry() -> users.Registry:
-    connection = tables.engine.connect()
-    return users.Registry(connection)
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+            await _flush_activities_logged()
+
+    _activity_flusher = asyncio.create_task(flush_periodically())
+
+
+async def stop_activity_flushing():
+    """Stop periodic flushing and write remaining users activities on application shutdown."""
+    if _activity_flusher is not None:
+        _activity_flusher.cancel()
+
+        with contextlib.suppress(asyncio.CancelledError):
+            await _activity_flusher
+
+    if _activity_flush is not None:
+        await _activity_flush
+
+    await flush_activities()
+
+
+async def stop_hash_pool():
+    """Stop password hashing processes on application shutdown."""
+    hash_pool.shutdown()
 
 
 class SignupRequest(pydantic.BaseModel):
@@ -26,68 +97,117 @@ class SignupRequest(pydantic.BaseModel):
     password: str
 
 
+class RefreshRequest(pydantic.BaseModel):
+    """Request for exchanging or revoking refresh token."""
+
+    refresh_token: str
+
+
 oauth2_scheme = security.OAuth2PasswordBearer(tokenUrl="/users/login", auto_error=False)
 
 
-def current_user(
-    token: str | None = fastapi.Depends(oauth2_scheme), registry: users.Registry = fastapi.Depends(registry)
+async def current_user(
+    token: str | None = fastapi.Depends(oauth2_scheme), registry: users.AsyncRegistry = fastapi.Depends(registry)
 ) -> str:
     """Dependency for retrieving username from a request."""
     if not token:
         raise fastapi.HTTPException(fastapi.status.HTTP_401_UNAUTHORIZED)
 
     try:
-        username = registry.authenticate(token)
+        username = await registry.authenticate(token)
     except users.Unauthorized:
         raise fastapi.HTTPException(fastapi.status.HTTP_403_FORBIDDEN)
 
     return username
 
 
-def optional_user(
-    token: str | None = fastapi.Depends(oauth2_scheme), registry: users.Registry = fastapi.Depends(registry)
+async def admin_user(username: str = fastapi.Depends(current_user)) -> str:
+    """Dependency for retrieving username of an administrator listed in `ADMIN_USERS` from a request."""
+    if username not in ADMIN_USERS:
+        raise fastapi.HTTPException(fastapi.status.HTTP_403_FORBIDDEN)
+
+    return username
+
+
+async def optional_user(
+    token: str | None = fastapi.Depends(oauth2_scheme), registry: users.AsyncRegistry = fastapi.Depends(registry)
 ) -> str | None:
     """Dependency for optional retrieving username from a request."""
     if not token:
         return None
 
-    return current_user(token, registry)
+    return await current_user(token, registry)
 
 
 async def track_activity(
     username: str | None = fastapi.Depends(optional_user),
-    registry: users.Registry = fastapi.Depends(registry),
+    registry: users.AsyncRegistry = fastapi.Depends(registry),
 ):
     """Dependency for tracking user activity."""
     if username is None:
         return
 
-    registry.track_activity(username)
+    if await registry.track_activity(username):
+        schedule_activity_flush()
 
 
 @router.post("", status_code=201)
-def signup(req: SignupRequest, registry: users.Registry = fastapi.Depends(registry)):
+async def signup(req: SignupRequest, registry: users.AsyncRegistry = fastapi.Depends(registry)):
     try:
-        registry.signup(req.username, req.password)
+        await registry.signup(req.username, req.password)
     except users.UserExists:
         raise fastapi.HTTPException(fastapi.status.HTTP_400_BAD_REQUEST, USER_EXISTS_ERROR)
+    except hashing.Overloaded:
+        raise fastapi.HTTPException(fastapi.status.HTTP_503_SERVICE_UNAVAILABLE, OVERLOADED_ERROR)
     return {"links": [{"rel": "login", "href": "/login", "action": "POST"}]}
 
 
 @router.post("/login")
-def login(
+async def login(
     form_data: security.OAuth2PasswordRequestForm = fastapi.Depends(),
-    registry: users.Registry = fastapi.Depends(registry),
+    registry: users.AsyncRegistry = fastapi.Depends(registry),
 ):
     try:
-        response = {"access_token": registry.login(form_data.username, form_data.password), "token_type": "bearer"}
+        response = {
+            "access_token": await registry.login(form_data.username, form_data.password),
+            "refresh_token": await registry.issue_refresh_token(form_data.username),
+            "token_type": "bearer",
+        }
     except users.Unauthorized:
         raise fastapi.HTTPException(fastapi.status.HTTP_401_UNAUTHORIZED)
-    registry.track_activity(form_data.username)
+    except hashing.Overloaded:
+        raise fastapi.HTTPException(fastapi.status.HTTP_503_SERVICE_UNAVAILABLE, OVERLOADED_ERROR)
+    if await registry.track_activity(form_data.username):
+        schedule_activity_flush()
+
     return response
 
 
+@router.post("/token/refresh")
+async def refresh_token(req: RefreshRequest, registry: users.AsyncRegistry = fastapi.Depends(registry)):
+    try:
+        access_token, refresh_token_ = await registry.refresh(req.refresh_token)
+    except users.Unauthorized:
+        raise fastapi.HTTPException(fastapi.status.HTTP_401_UNAUTHORIZED)
+    return {"access_token": access_token, "refresh_token": refresh_token_, "token_type": "bearer"}
+
+
+@router.post("/token/revoke", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+async def revoke_token(req: RefreshRequest, registry: users.AsyncRegistry = fastapi.Depends(registry)):
+    await registry.revoke_refresh_token(req.refresh_token)
+    return fastapi.Response(status_code=fastapi.status.HTTP_204_NO_CONTENT)
+
+
 @router.get("/activity")
-def get_activity(username: str = fastapi.Depends(current_user), registry: users.Registry = fastapi.Depends(registry)):
-    last_login, last_activity = registry.get_activities(username)
+async def get_activity(
+    username: str = fastapi.Depends(current_user), registry: users.AsyncRegistry = fastapi.Depends(registry)
+):
+    last_login, last_activity = await registry.get_activities(username)
     return {"last_login": last_login, "last_activity": last_activity}
+
+
+async def _flush_activities_logged():
+    try:
+        await flush_activities()
+    except Exception:
+        logger.exception("Failed to flush users activities")
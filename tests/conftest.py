@@ -1,20 +1,26 @@
 """Pytest fixtures."""
 
 
+from __future__ import annotations
+
 import collections
 import dataclasses
 import datetime
 import functools
-from typing import Optional
+import os
+from typing import AsyncIterator, Iterable, Optional
 
 import fastapi
 import faker
 import httpx
 import pytest
 
-import posts
-import users
-import web
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+import hashing  # noqa: E402
+import posts  # noqa: E402
+import users  # noqa: E402
+import web  # noqa: E402
 
 
 fake = faker.Faker()
@@ -26,16 +32,22 @@ class StubUsersRegistry:
 
     signup_calls: list[tuple[str, str]] = dataclasses.field(default_factory=list)
     track_calls: list[str] = dataclasses.field(default_factory=list)
+    overloaded: bool = False
+    revoked: list[str] = dataclasses.field(default_factory=list)
     _users: dict[tuple, str] = dataclasses.field(default_factory=dict)
+    _refresh_tokens: dict[str, str] = dataclasses.field(default_factory=dict)
     _tracks: dict[str, tuple[datetime.datetime, datetime.datetime]] = dataclasses.field(default_factory=dict)
 
-    def signup(self, username: str, password: str):
+    async def signup(self, username: str, password: str):
         """Signup new user.
 
         Args:
             username: user login identificator.
             password: user auth password.
         """
+        if self.overloaded:
+            raise hashing.Overloaded
+
         for u, _ in self.signup_calls:
             if u == username:
                 raise users.UserExists
@@ -56,7 +68,7 @@ class StubUsersRegistry:
         self._users[(user["username"], user["password"])] = token
         return token
 
-    def login(self, username: str, password: str) -> str:
+    async def login(self, username: str, password: str) -> str:
         """Login registered user.
 
         Args:
@@ -65,6 +77,9 @@ class StubUsersRegistry:
         Returns:
             Access auth token.
         """
+        if self.overloaded:
+            raise hashing.Overloaded
+
         try:
             return self._users[(username, password)]
         except KeyError:
@@ -84,7 +99,45 @@ class StubUsersRegistry:
         self._users[(username, password)] = token
         return username
 
-    def authenticate(self, token: str) -> dict | None:
+    async def issue_refresh_token(self, username: str) -> str:
+        """Issue long-lived token for getting new access tokens.
+
+        Args:
+            username: user login identificator.
+        Returns:
+            Refresh token.
+        """
+        refresh_token = fake.pystr()
+        self._refresh_tokens[refresh_token] = username
+        return refresh_token
+
+    async def refresh(self, refresh_token: str) -> tuple[str, str]:
+        """Exchange refresh token for new access and refresh tokens.
+
+        Args:
+            refresh_token: token issued on user login or previous refresh.
+        Returns:
+            Access auth token and new refresh token.
+        """
+        try:
+            username = self._refresh_tokens.pop(refresh_token)
+        except KeyError:
+            raise users.Unauthorized
+
+        token = fake.pystr()
+        self._users[(username, fake.pystr())] = token
+        return token, await self.issue_refresh_token(username)
+
+    async def revoke_refresh_token(self, refresh_token: str):
+        """Revoke refresh token.
+
+        Args:
+            refresh_token: revoked token.
+        """
+        self.revoked.append(refresh_token)
+        self._refresh_tokens.pop(refresh_token, None)
+
+    async def authenticate(self, token: str) -> dict | None:
         """Authenticate user with a token.
 
         Args:
@@ -99,13 +152,16 @@ class StubUsersRegistry:
 
         return user
 
-    def track_activity(self, username: str):
+    async def track_activity(self, username: str) -> bool:
         """Track user activity.
 
         Args:
             username: user login identificator.
+        Returns:
+            Whether activity buffer is full, never for the stub.
         """
         self.track_calls.append(username)
+        return False
 
     def add_tracks(self, username: str, last_login: datetime.datetime, last_activity: datetime.datetime):
         """Add user activity track.
@@ -119,7 +175,7 @@ class StubUsersRegistry:
         """
         self._tracks[username] = (last_login, last_activity)
 
-    def get_activities(self, username: str) -> tuple[datetime.datetime, datetime.datetime]:
+    async def get_activities(self, username: str) -> tuple[datetime.datetime, datetime.datetime]:
         """Get last user actities tracks.
 
         Args:
@@ -138,13 +194,18 @@ class StubPostsCatalog:
     like_calls: list[tuple[posts.ID, str]] = dataclasses.field(default_factory=list)
     unlike_calls: list[tuple[posts.ID, str]] = dataclasses.field(default_factory=list)
     analytics_calls: list[tuple[datetime.date | None, datetime.date | None]] = dataclasses.field(default_factory=list)
+    series_calls: list[tuple[datetime.date | None, datetime.date | None, posts.Bucket]] = dataclasses.field(
+        default_factory=list
+    )
     count: int = dataclasses.field(default=0)
+    series: list[tuple[datetime.date, int]] = dataclasses.field(default_factory=list)
+    max_buckets: int | None = None
     _posts: dict[posts.ID, dict] = dataclasses.field(default_factory=dict)
     _likes: dict[posts.ID, list[str]] = dataclasses.field(
         default_factory=functools.partial(collections.defaultdict, list)
     )
 
-    def make_post(self, author: str, req: posts.MakePostRequest) -> posts.ID:
+    async def make_post(self, author: str, req: posts.MakePostRequest) -> posts.ID:
         """Make a new post.
 
         Args:
@@ -156,6 +217,17 @@ class StubPostsCatalog:
         self.post_calls.append((author, req.dict()))
         return len(self.post_calls)
 
+    async def make_posts(self, author: str, reqs: list[posts.MakePostRequest]) -> list[posts.ID]:
+        """Make new posts in bulk.
+
+        Args:
+            author: user making new posts.
+            reqs: new post requests.
+        Returns:
+            New posts IDs.
+        """
+        return [await self.make_post(author, req) for req in reqs]
+
     def add_post(self, post: dict):
         """Add post to catalog.
 
@@ -166,7 +238,7 @@ class StubPostsCatalog:
         """
         self._posts[post["id"]] = post
 
-    def get(self, post_id: posts.ID) -> Optional[dict]:
+    async def get(self, post_id: posts.ID) -> Optional[dict]:
         """Get post from catalog.
 
         Args:
@@ -176,6 +248,51 @@ class StubPostsCatalog:
         """
         return self._posts.get(post_id)
 
+    async def list(self, after: posts.ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts in ID order.
+
+        Args:
+            after: ID of the last post on the previous page.
+            limit: maximum number of listed posts.
+        Returns:
+            Posts following the given ID.
+        """
+        listed = [dict(p) for i, p in sorted(self._posts.items()) if after is None or i > after]
+        return listed[:limit]
+
+    async def list_by_author(self, author: str, before: posts.ID | None = None, limit: int = 20) -> list[dict]:
+        """List posts of the author, newest first.
+
+        Args:
+            author: user who made the posts.
+            before: ID of the last post on the previous page.
+            limit: maximum number of listed posts.
+        Returns:
+            Author posts preceding the given ID.
+        """
+        listed = [
+            dict(p)
+            for i, p in sorted(self._posts.items(), reverse=True)
+            if p["author"] == author and (before is None or i < before)
+        ]
+        return listed[:limit]
+
+    async def get_for_viewer(self, post_id: posts.ID, username: str | None) -> Optional[dict]:
+        """Get post from catalog together with the viewer like.
+
+        Args:
+            post_id: unique ID to look for.
+            username: viewing user.
+        Returns:
+            Saved post in catalog with `liked` flag if found.
+        """
+        post = self._posts.get(post_id)
+
+        if post is None:
+            return None
+
+        return post | {"liked": username in self._likes.get(post_id, ())}
+
     def add_like(self, username: str, post_id: posts.ID):
         """Add like from user.
 
@@ -187,7 +304,7 @@ class StubPostsCatalog:
         """
         self._likes[post_id].append(username)
 
-    def has_like(self, post_id: posts.ID, username: str) -> bool:
+    async def has_like(self, post_id: posts.ID, username: str) -> bool:
         """Check whether the user has liked the post.
 
         Args:
@@ -201,7 +318,47 @@ class StubPostsCatalog:
         except KeyError:
             return False
 
-    def like(self, post_id: posts.ID, username):
+    async def has_likes(self, post_ids: Iterable[posts.ID], username: str) -> dict[posts.ID, bool]:
+        """Check whether the user has liked each of the posts.
+
+        Args:
+            post_ids: unique IDs to look for.
+            username: checking user.
+        Returns:
+            Whether the user has liked the post for every given post ID.
+        """
+        return {post_id: username in self._likes.get(post_id, ()) for post_id in post_ids}
+
+    async def apply_likes(self, username: str, reqs: list[posts.LikeRequest]) -> list[posts.LikeResult]:
+        """Like and unlike many posts at once.
+
+        Args:
+            username: liking user.
+            reqs: like and unlike requests.
+        Returns:
+            Result of every request.
+        """
+        results = []
+
+        for req in reqs:
+            like, likes = req.action is posts.LikeAction.LIKE, self._likes[req.post_id]
+
+            if req.post_id not in self._posts:
+                results.append(posts.LikeResult.NOT_FOUND)
+            elif like and self._posts[req.post_id]["author"] == username:
+                results.append(posts.LikeResult.AUTHOR_LIKED)
+            elif (username in likes) == like:
+                results.append(posts.LikeResult.ALREADY_LIKED if like else posts.LikeResult.NOT_LIKED)
+            elif like:
+                likes.append(username)
+                results.append(posts.LikeResult.OK)
+            else:
+                likes.remove(username)
+                results.append(posts.LikeResult.OK)
+
+        return results
+
+    async def like(self, post_id: posts.ID, username):
         """Like post.
 
         Args:
@@ -213,7 +370,7 @@ class StubPostsCatalog:
 
         self.like_calls.append((post_id, username))
 
-    def unlike(self, post_id: posts.ID, username):
+    async def unlike(self, post_id: posts.ID, username):
         """Unlike post.
 
         Args:
@@ -225,7 +382,42 @@ class StubPostsCatalog:
 
         self.unlike_calls.append((post_id, username))
 
-    def analytics(self, start: datetime.date | None = None, end: datetime.date | None = None) -> int:
+    async def export_posts(
+        self, start: posts.ID | None = None, end: posts.ID | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Stream posts in ID order.
+
+        Args:
+            start: first exported post ID.
+            end: last exported post ID.
+            batch_size: number of rows fetched at once.
+        Returns:
+            Posts in the ID range.
+        """
+        for post_id, post in sorted(self._posts.items()):
+            if (start is None or start <= post_id) and (end is None or post_id <= end):
+                yield post
+
+    async def export_likes(
+        self, start: datetime.date | None = None, end: datetime.date | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Stream likes.
+
+        Args:
+            start: first exported date.
+            end: last exported date.
+            batch_size: number of rows fetched at once.
+        Returns:
+            Likes made today if in the date range.
+        """
+        today = datetime.date.today()
+
+        if (start is None or start <= today) and (end is None or today <= end):
+            for post_id, usernames in self._likes.items():
+                for username in usernames:
+                    yield {"user": username, "post": post_id, "date": today}
+
+    async def analytics(self, start: datetime.date | None = None, end: datetime.date | None = None) -> int:
         """Get aggregated likes count.
 
         Args:
@@ -237,6 +429,33 @@ class StubPostsCatalog:
         self.analytics_calls.append((start, end))
         return self.count
 
+    async def analytics_series(
+        self,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        bucket: posts.Bucket = posts.Bucket.DAY,
+        max_buckets: int | None = None,
+    ) -> list[tuple[datetime.date, int]]:
+        """Get likes count time series.
+
+        Args:
+            start: start date of aggregating.
+            end: end date of aggregating.
+            bucket: size of aggregated periods.
+            max_buckets: maximum number of periods in the series.
+        Returns:
+            Start date of every period in the range with number of likes made in it.
+        Raises:
+            TooManyBuckets: the stub series is longer than `max_buckets`.
+        """
+        self.series_calls.append((start, end, bucket))
+        self.max_buckets = max_buckets
+
+        if max_buckets is not None and len(self.series) > max_buckets:
+            raise posts.TooManyBuckets
+
+        return self.series
+
 
 @pytest.fixture()
 def app(registry: StubUsersRegistry, catalog: StubPostsCatalog) -> fastapi.FastAPI:
@@ -1,44 +1,37 @@
 """Pytest fixtures."""
 
 
-from typing import Generator
+from typing import AsyncGenerator, Generator
+
 import fastapi
 import httpx
 import pytest
-import sqlalchemy
-from sqlalchemy.engine import base
+from sqlalchemy.ext import asyncio
 
-import posts
 import tables
-import users
 import web
+from web import posts, users
 
 
 @pytest.fixture()
-def engine() -> Generator[sqlalchemy.engine.Engine, None, None]:
-    engine = sqlalchemy.create_engine(
-        "sqlite+pysqlite:///:memory:", future=True, connect_args={"check_same_thread": False}
-    )
-    tables.metadata.create_all(engine)
+async def engine() -> AsyncGenerator[asyncio.AsyncEngine, None]:
+    engine = tables.create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async with engine.begin() as connection:
+        await connection.run_sync(tables.metadata.create_all)
+
     yield engine
-    tables.metadata.drop_all(engine)
+    await engine.dispose()
 
 
 @pytest.fixture()
-def app(engine: sqlalchemy.engine.Engine) -> Generator[fastapi.FastAPI, None, None]:
+def app(engine: asyncio.AsyncEngine, monkeypatch: pytest.MonkeyPatch) -> Generator[fastapi.FastAPI, None, None]:
+    monkeypatch.setattr(tables, "async_engine", engine)
     app_ = web.create_app()
-
-    def catalog(connection: base.Connection) -> posts.Catalog:
-        return posts.Catalog(connection)
-
-    def registry(connection: base.Connection) -> users.Registry:
-        return users.Registry(connection)
-
-    with engine.begin() as connection:
-        app_.dependency_overrides.update(
-            {web.catalog: lambda: catalog(connection), web.registry: lambda: registry(connection)}
-        )
-        yield app_
+    yield app_
+    users.hash_pool.shutdown()
+    posts.post_cache.clear()
+    posts.analytics_cache.clear()
 
 
 @pytest.fixture()
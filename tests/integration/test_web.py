@@ -1,6 +1,17 @@
-from typing import Sequence
+import datetime
+import json
+import pathlib
+from typing import Any, AsyncGenerator, Callable, Sequence
+import fastapi
 import faker
 import httpx
+import pytest
+import sqlalchemy
+from sqlalchemy.ext import asyncio
+
+import tables
+import users
+from web import posts as web_posts, users as web_users
 
 
 fake = faker.Faker()
@@ -22,13 +33,93 @@ async def test_users_posts_sql_web_integration(client: httpx.AsyncClient):
 
     await _like_post(client, 1)
     resp = await _get_post(client, post_response)
-    _assert_post(resp, request, author, "unlike")
+    _assert_post(resp, request, author, "unlike", like_count=1)
 
     await _unlike_post(client, 1)
     resp = await _get_post(client, post_response)
     _assert_post(resp, request, author, "like")
 
 
+async def test_exporting_posts(client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch):
+    user = _new_user()
+    monkeypatch.setattr(web_users, "ADMIN_USERS", frozenset([user["username"]]))
+    await _auth(client, user)
+    requests = [_new_post_request() for _ in range(3)]
+    await client.post("/posts/batch", json=requests)
+
+    resp = await client.get("/posts/export", params={"id_from": 2})
+
+    exported = [json.loads(line) for line in resp.text.splitlines()]
+    assert [{"title": p["title"], "description": p["description"]} for p in exported] == requests[1:]
+
+
+class TestRequestTransaction:
+    async def test_commits_before_responding(self, app: fastapi.FastAPI, engine: asyncio.AsyncEngine):
+        events = []
+        client = _recording_client(app, engine, events)
+
+        resp = await _signup(client, _new_user())
+
+        assert resp.status_code == 201, "User was not signed up"
+        assert events == ["commit", "response"], "Response was sent before commit"
+
+    async def test_rolls_back_error_responses(self, app: fastapi.FastAPI, engine: asyncio.AsyncEngine):
+        events = []
+        client = _recording_client(app, engine, events)
+        user = _new_user()
+        await _signup(client, user)
+        events.clear()
+
+        resp = await _signup(client, user)
+
+        assert resp.status_code == 400, "User was signed up twice"
+        assert events == ["rollback", "response"], "Failed request was not rolled back before response"
+
+    async def test_invalidates_caches_before_responding(self, app: fastapi.FastAPI, engine: asyncio.AsyncEngine):
+        events, cached = [], []
+        client = _recording_client(app, engine, events, lambda: cached.append(len(web_posts.analytics_cache)))
+        await _auth(client, _new_user())
+        await _make_post(client, _new_post_request())
+        await _auth(client, _new_user())
+        stale = (await client.get("/analytics")).json()["likes"]
+
+        def cache_stale_likes(_):
+            web_posts.analytics_cache.set((None, None), stale)
+
+        sqlalchemy.event.listen(engine.sync_engine, "commit", cache_stale_likes, once=True)
+        cached.clear()
+        await _like_post(client, 1)
+
+        assert cached == [0], "Likes cached before commit were not invalidated before response"
+
+
+class TestActivityFlush:
+    @pytest.fixture()
+    async def engine(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> AsyncGenerator[asyncio.AsyncEngine, None]:
+        engine = tables.create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'posts.db'}")
+
+        async with engine.begin() as connection:
+            await connection.run_sync(tables.metadata.create_all)
+
+        monkeypatch.setattr(web_users, "activity_buffer", users.ActivityBuffer(maxsize=1))
+        yield engine
+        await engine.dispose()
+
+    async def test_keeps_activities_of_failed_request(self, client: httpx.AsyncClient, engine: asyncio.AsyncEngine):
+        user = _new_user()
+        await _auth(client, user)
+        await web_users.stop_activity_flushing()
+        logged_in = await _last_activity(engine, user)
+
+        resp = await client.get("/posts/999")
+        await web_users.stop_activity_flushing()
+
+        assert resp.status_code == 404, "Missing post was found"
+        assert await _last_activity(engine, user) > logged_in, "Activity of failed request was lost"
+
+
 def _new_user() -> dict:
     return {"username": fake.pystr(), "password": fake.pystr()}
 
@@ -43,6 +134,32 @@ async def _auth(client: httpx.AsyncClient, user: dict):
     client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
 
 
+def _recording_client(
+    app: fastapi.FastAPI, engine: asyncio.AsyncEngine, events: list[str], on_response: Callable[[], Any] = lambda: None
+) -> httpx.AsyncClient:
+    for name in ("commit", "rollback"):
+        sqlalchemy.event.listen(engine.sync_engine, name, lambda _, name=name: events.append(name))
+
+    async def recording_app(scope, receive, send):
+        async def send_(message):
+            if message["type"] == "http.response.start":
+                events.append("response")
+                on_response()
+
+            await send(message)
+
+        await app(scope, receive, send_)
+
+    return httpx.AsyncClient(app=recording_app, base_url="https://testserver")
+
+
+async def _last_activity(engine: asyncio.AsyncEngine, user: dict) -> datetime.datetime:
+    select = sqlalchemy.select(tables.users.c.last_activity).where(tables.users.c.username == user["username"])
+
+    async with engine.connect() as connection:
+        return (await connection.execute(select)).scalar()
+
+
 async def _signup(client: httpx.AsyncClient, user: dict) -> httpx.Response:
     return await client.post("/users", json=user)
 
@@ -67,7 +184,7 @@ async def _unlike_post(client: httpx.AsyncClient, post_id: int) -> httpx.Respons
     return await client.delete(f"/posts/{post_id}/like")
 
 
-def _assert_post(response: httpx.Response, request: dict, author: dict, *rels: Sequence[str]):
+def _assert_post(response: httpx.Response, request: dict, author: dict, *rels: Sequence[str], like_count: int = 0):
     links = []
 
     if "like" in rels:
@@ -81,5 +198,6 @@ def _assert_post(response: httpx.Response, request: dict, author: dict, *rels: S
         "author": author["username"],
         "title": request["title"],
         "description": request["description"],
+        "like_count": like_count,
         "links": links,
     }
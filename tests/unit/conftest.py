@@ -1,10 +1,11 @@
 """Pytest fixtures for unit tests suite."""
 
 
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 import pytest
 import sqlalchemy as sa
+from sqlalchemy.ext import asyncio
 
 import tables
 
@@ -15,3 +16,14 @@ def engine() -> Generator[sa.engine.Engine, None, None]:
     tables.metadata.create_all(engine_)
     yield engine_
     tables.metadata.drop_all(engine_)
+
+
+@pytest.fixture()
+async def async_engine() -> AsyncGenerator[asyncio.AsyncEngine, None]:
+    engine_ = tables.create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async with engine_.begin() as connection:
+        await connection.run_sync(tables.metadata.create_all)
+
+    yield engine_
+    await engine_.dispose()
@@ -0,0 +1,94 @@
+import math
+
+import faker
+
+import cache
+
+
+fake = faker.Faker()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCache:
+    def test_returns_cached_value(self):
+        cache_ = cache.Cache(maxsize=2)
+        key, value = fake.pystr(), fake.pystr()
+
+        cache_.set(key, value)
+
+        assert cache_.get(key) == value, "Wrong value cached"
+        assert cache_.get(fake.pystr()) is None, "Got value for missing key"
+        assert cache_.stats == cache.Stats(hits=1, misses=1, evictions=0), "Wrong cache stats"
+
+    def test_evicts_least_recently_used(self):
+        cache_ = cache.Cache(maxsize=2)
+        cache_.set("first", 1)
+        cache_.set("second", 2)
+        cache_.get("first")
+
+        cache_.set("third", 3)
+
+        assert cache_.get("second") is None, "Most recently used entry was evicted"
+        assert cache_.get("first") == 1, "Least recently used entry was not evicted"
+        assert cache_.stats.evictions == 1, "Eviction was not counted"
+
+    def test_expires_entries(self):
+        clock = FakeClock()
+        cache_ = cache.Cache(maxsize=2, ttl=10, clock=clock)
+        cache_.set("expiring", 1)
+        cache_.set("eternal", 2, math.inf)
+
+        clock.now = 10
+
+        assert cache_.get("expiring") is None, "Entry did not expire"
+        assert cache_.get("eternal") == 2, "Entry without expiry expired"
+
+    def test_invalidates_matching_entries(self):
+        cache_ = cache.Cache(maxsize=3)
+        cache_.set(1, "odd")
+        cache_.set(2, "even")
+        cache_.set(3, "odd")
+
+        dropped = cache_.invalidate(lambda _, value: value == "odd")
+
+        assert dropped == 2, "Wrong number of entries invalidated"
+        assert cache_.get(2) == "even", "Wrong entry invalidated"
+        assert len(cache_) == 1, "Entries were not invalidated"
+
+    def test_evicts_by_bytes(self):
+        cache_ = cache.Cache(maxsize=10, maxbytes=10, sizeof=len)
+        cache_.set("first", "12345")
+        cache_.set("second", "12345")
+
+        cache_.set("third", "1")
+
+        assert cache_.get("first") is None, "Entry over bytes limit was not evicted"
+        assert cache_.get("second") == "12345", "Wrong entry evicted"
+        assert cache_.nbytes == 6, "Wrong cached bytes"
+        assert cache_.stats.evictions == 1, "Eviction was not counted"
+
+    def test_does_not_keep_too_large_entry(self):
+        cache_ = cache.Cache(maxsize=10, maxbytes=10, sizeof=len)
+
+        cache_.set("large", "12345678901")
+
+        assert cache_.get("large") is None, "Entry over bytes limit was cached"
+        assert cache_.nbytes == 0, "Wrong cached bytes"
+
+    def test_counts_replaced_entry_bytes(self):
+        cache_ = cache.Cache(maxsize=10, maxbytes=10_000)
+        cache_.set("key", {"title": "a" * 10})
+        size = cache_.nbytes
+
+        cache_.set("key", {"title": "a" * 20})
+        cache_.pop("key")
+
+        assert size > 0, "Value size was not estimated"
+        assert cache_.nbytes == 0, "Dropped entry bytes were not released"
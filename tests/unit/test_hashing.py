@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import os
+
+import faker
+import pytest
+
+import hashing
+
+
+fake = faker.Faker()
+
+
+class TestHashers:
+    @pytest.mark.parametrize("hasher", [hashing.PBKDF2Hasher(1000), hashing.ScryptHasher(2**10)])
+    def test_verifies_password(self, hasher: hashing.Hasher):
+        password = fake.pystr()
+
+        password_hash = hasher.hash(password)
+
+        assert password_hash.startswith(f"{hasher.algorithm}${hasher.cost}$"), "Hash parameters were not encoded"
+        assert hashing.verify(password, password_hash), "Password was not verified"
+        assert not hashing.verify(fake.pystr(), password_hash), "Wrong password was verified"
+
+    def test_verifies_legacy_hash(self):
+        password, salt = fake.pystr(), os.urandom(32)
+        password_hash = hashing.encode_legacy(
+            hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100_000, 128), salt
+        )
+
+        assert hashing.verify(password, password_hash), "Legacy password was not verified"
+        assert hashing.needs_rehash(password_hash, hashing.PBKDF2Hasher()), "Legacy hash does not need rehash"
+
+    def test_needs_rehash(self):
+        password_hash = hashing.PBKDF2Hasher(1000).hash(fake.pystr())
+
+        assert not hashing.needs_rehash(password_hash, hashing.PBKDF2Hasher(1000)), "Current hash needs rehash"
+        assert hashing.needs_rehash(password_hash, hashing.PBKDF2Hasher(2000)), "Cheaper hash does not need rehash"
+        assert hashing.needs_rehash(password_hash, hashing.ScryptHasher()), "Other algorithm does not need rehash"
+
+    def test_rejects_unknown_algorithm(self):
+        with pytest.raises(hashing.UnknownHash):
+            hashing.verify(fake.pystr(), "md5$c2FsdA$aGFzaA")
+
+
+def test_calibrate():
+    durations = iter([0.0, 1.0, 0.0, 3.0])
+
+    hasher = hashing.calibrate("pbkdf2_sha256", 2.5, timer=durations.__next__)
+
+    assert hasher == hashing.PBKDF2Hasher(20_000), "Wrong cost calibrated"
+
+
+class TestHashPool:
+    async def test_hashing_password(self):
+        pool = hashing.HashPool(workers=1)
+        hasher, password = hashing.PBKDF2Hasher(1000), fake.pystr()
+
+        try:
+            password_hash = await pool.hash(hasher, password)
+            verified = await pool.verify(password, password_hash)
+        finally:
+            pool.shutdown()
+
+        assert verified, "Password was not verified"
+        assert pool.hash_time.count == 2, "Hash time was not observed"
+        assert pool.queue_time.count == 2, "Queue time was not observed"
+
+    async def test_rejects_hashes_when_saturated(self):
+        pool = hashing.HashPool(workers=1, max_pending=1)
+        hasher = hashing.PBKDF2Hasher(1000)
+
+        try:
+            results = await asyncio.gather(
+                pool.hash(hasher, fake.pystr()), pool.hash(hasher, fake.pystr()), return_exceptions=True
+            )
+        finally:
+            pool.shutdown()
+
+        assert isinstance(results[1], hashing.Overloaded), "Hash was not rejected"
+        assert pool.rejected == 1, "Rejected hash was not counted"
+        assert pool.pending == 0, "Pool still has pending hashes"
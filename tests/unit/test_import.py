@@ -0,0 +1,74 @@
+import datetime
+import importlib.util
+import pathlib
+from typing import Generator, Iterator
+
+import pytest
+import sqlalchemy
+
+import migrations
+import tables
+
+
+IMPORT_SCRIPT = pathlib.Path(__file__).resolve().parents[2] / "bin" / "import.py"
+spec = importlib.util.spec_from_file_location("bulk_import", IMPORT_SCRIPT)
+bulk_import = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bulk_import)
+
+
+@pytest.fixture()
+def engine() -> Generator[sqlalchemy.engine.Engine, None, None]:
+    engine_ = tables.create_engine("sqlite+pysqlite:///:memory:")
+
+    with engine_.begin() as connection:
+        migrations.migrate(connection)
+        bulk_import.import_progress.create(connection)
+
+    yield engine_
+    engine_.dispose()
+
+
+def test_resuming_interrupted_import(engine: sqlalchemy.engine.Engine):
+    rows = [{"id": str(i), "author": "author", "title": f"title {i}", "description": ""} for i in range(1, 6)]
+
+    def interrupted() -> Iterator[dict]:
+        yield from rows[:3]
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        bulk_import._import(engine, tables.posts, "posts", interrupted(), 2)
+
+    changed = [row | {"title": "changed"} for row in rows[:2]]
+    done = bulk_import._import(engine, tables.posts, "posts", changed + rows[2:], 2)
+
+    with engine.connect() as connection:
+        titles = connection.execute(sqlalchemy.select(tables.posts.c.title).order_by(tables.posts.c.id)).scalars()
+
+        assert done == 5, "Wrong number of imported rows"
+        assert list(titles) == [row["title"] for row in rows], "Committed chunks were imported again"
+
+
+def test_leaving_empty_cells_to_defaults(engine: sqlalchemy.engine.Engine, tmp_path: pathlib.Path):
+    path = tmp_path / "likes.csv"
+    path.write_text("user,post,date\nfirst,1,2022-04-01\nsecond,1,\n")
+
+    bulk_import._import(engine, tables.likes, "likes", bulk_import._read(path, "csv"), 10)
+
+    with engine.connect() as connection:
+        select = sqlalchemy.select(tables.likes.c.user, tables.likes.c.date).order_by(tables.likes.c.user)
+        likes = connection.execute(select).all()
+
+        today = datetime.datetime.utcnow().date()
+        assert likes == [("first", datetime.date(2022, 4, 1)), ("second", today)], "Empty date was not defaulted"
+
+
+def test_keeping_empty_text_cells(engine: sqlalchemy.engine.Engine, tmp_path: pathlib.Path):
+    path = tmp_path / "posts.csv"
+    path.write_text("id,author,title,description\n1,author,title,\n")
+
+    bulk_import._import(engine, tables.posts, "posts", bulk_import._read(path, "csv"), 10)
+
+    with engine.connect() as connection:
+        description = connection.execute(sqlalchemy.select(tables.posts.c.description)).scalar()
+
+        assert description == "", "Empty text was not imported as is"
@@ -0,0 +1,64 @@
+import sqlalchemy
+
+import migrations
+import tables
+
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE users (username VARCHAR PRIMARY KEY, password VARCHAR NOT NULL, salt VARCHAR NOT NULL, "
+    "last_login DATETIME, last_activity DATETIME)",
+    "CREATE TABLE posts (id INTEGER PRIMARY KEY, author VARCHAR REFERENCES users (username), "
+    "title VARCHAR NOT NULL, description VARCHAR NOT NULL)",
+    'CREATE TABLE likes ("user" VARCHAR REFERENCES users (username), post INTEGER REFERENCES posts (id), '
+    'date DATE DEFAULT (CURRENT_TIMESTAMP), UNIQUE ("user", post))',
+)
+
+
+def test_migrating_new_database():
+    engine = tables.create_engine("sqlite+pysqlite:///:memory:")
+
+    with engine.begin() as connection:
+        applied = migrations.migrate(connection)
+
+        assert applied == list(range(1, len(migrations.MIGRATIONS) + 1)), "Wrong migrations applied"
+        _assert_indexes(connection)
+
+
+def test_migrating_legacy_database():
+    engine = tables.create_engine("sqlite+pysqlite:///:memory:")
+
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(sqlalchemy.text(statement))
+
+        connection.execute(
+            sqlalchemy.text("INSERT INTO posts (id, author, title, description) VALUES (1, 'a', '', '')")
+        )
+        connection.execute(sqlalchemy.text("INSERT INTO likes (\"user\", post) VALUES ('b', 1), ('c', 1)"))
+
+        applied = migrations.migrate(connection)
+
+        assert applied == list(range(1, len(migrations.MIGRATIONS) + 1)), "Wrong migrations applied"
+        _assert_indexes(connection)
+        like_count = connection.execute(sqlalchemy.text("SELECT like_count FROM posts WHERE id = 1")).scalar()
+        assert like_count == 2, "Like counts were not backfilled"
+        daily_likes = connection.execute(sqlalchemy.text("SELECT sum(likes) FROM likes_daily")).scalar()
+        assert daily_likes == 2, "Daily likes were not backfilled"
+
+
+def test_migrating_up_to_date_database():
+    engine = tables.create_engine("sqlite+pysqlite:///:memory:")
+
+    with engine.begin() as connection:
+        migrations.migrate(connection)
+
+        applied = migrations.migrate(connection)
+
+        assert applied == [], "Applied migrations twice"
+
+
+def _assert_indexes(connection: sqlalchemy.engine.Connection):
+    inspector = sqlalchemy.inspect(connection)
+    have = {i["name"] for table in ("posts", "likes") for i in inspector.get_indexes(table)}
+    want = {"ix_posts_author_id_desc", "ix_likes_date", "ix_likes_post_user", "ix_likes_user"}
+    assert want <= have, f"Missing indexes {want - have}"
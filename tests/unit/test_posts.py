@@ -1,10 +1,14 @@
 import datetime
+import pathlib
 import faker
 import pytest
 import sqlalchemy
 from sqlalchemy.engine import base
+from sqlalchemy.ext import asyncio
 
+import cache
 import posts
+import tables
 
 
 fake = faker.Faker()
@@ -22,6 +26,26 @@ def test_making_new_post(engine: sqlalchemy.engine.Engine):
         _assert_post_saved(post_id, author, request, post)
 
 
+class TestMakePosts:
+    def test_making_new_posts(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            author = _random_user()
+            existing_id = catalog.make_post(_random_user(), _new_post_request())
+            requests = [_new_post_request() for _ in range(3)]
+
+            post_ids = catalog.make_posts(author, requests)
+
+            assert post_ids == [existing_id + 1, existing_id + 2, existing_id + 3], "Wrong posts IDs"
+
+            for post_id, request in zip(post_ids, requests):
+                _assert_post_saved(post_id, author, request, _select_post(connection, post_id))
+
+    def test_with_no_requests(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            assert posts.Catalog(connection).make_posts(_random_user(), []) == [], "Made posts from nothing"
+
+
 class TestGetPost:
     def test_retrieving_post(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
@@ -43,6 +67,88 @@ class TestGetPost:
             assert result is None, "Post does not have a like from user"
 
 
+class TestGetForViewer:
+    def test_with_viewer_like(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username, post = _random_user(), _new_post()
+            _insert_post(connection, post)
+            _like_post(connection, post, username)
+
+            result = catalog.get_for_viewer(post["id"], username)
+
+            _assert_post(result, post | {"liked": True})
+
+    def test_without_viewer_like(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            _like_post(connection, post, _random_user())
+
+            assert catalog.get_for_viewer(post["id"], _random_user()) == post | {"liked": False}, "Post is liked"
+            assert catalog.get_for_viewer(post["id"], None) == post | {"liked": False}, "Post is liked anonymously"
+
+    def test_with_non_existent_post(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+
+            assert catalog.get_for_viewer(fake.pyint(min_value=1), _random_user()) is None, "Found missing post"
+
+
+class TestList:
+    def test_listing_pages(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            posts_ = [_new_post() | {"id": i} for i in range(1, 6)]
+
+            for post in posts_:
+                _insert_post(connection, post)
+
+            first = catalog.list(limit=2)
+            second = catalog.list(after=first[-1]["id"], limit=2)
+            last = catalog.list(after=4, limit=2)
+
+            assert first == posts_[:2], "Wrong first page"
+            assert second == posts_[2:4], "Wrong second page"
+            assert last == posts_[4:], "Wrong last page"
+
+    def test_with_no_posts(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            assert posts.Catalog(connection).list() == [], "Listed posts from empty catalog"
+
+
+class TestListByAuthor:
+    def test_listing_pages(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            author = _random_user()
+            posts_ = [_new_post(author) | {"id": i} for i in range(1, 6)]
+
+            for post in posts_ + [_new_post() | {"id": 6}]:
+                _insert_post(connection, post)
+
+            first = catalog.list_by_author(author, limit=3)
+            last = catalog.list_by_author(author, before=first[-1]["id"], limit=3)
+
+            assert first == posts_[:1:-1], "Wrong first page"
+            assert last == posts_[1::-1], "Wrong last page"
+
+    def test_scans_author_index(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            select = (
+                sqlalchemy.select(tables.posts)
+                .where(tables.posts.c.author == "author", tables.posts.c.id < 100)
+                .order_by(tables.posts.c.id.desc())
+                .limit(20)
+            )
+            sql = str(select.compile(engine, compile_kwargs={"literal_binds": True}))
+
+            plan = connection.execute(sqlalchemy.text(f"EXPLAIN QUERY PLAN {sql}")).fetchone().detail
+
+            assert "USING INDEX ix_posts_author_id_desc" in plan, f"Author index is not used: {plan}"
+
+
 class TestHasLike:
     def test_with_existing_like(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
@@ -67,6 +173,38 @@ class TestHasLike:
 
             assert result is False, "Post has a like from user"
 
+    def test_with_like_from_another_user(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username = _random_user()
+            post = _new_post()
+            _insert_post(connection, post)
+            _like_post(connection, post, _random_user())
+
+            result = catalog.has_like(post["id"], username)
+
+            assert result is False, "Post has a like from user"
+
+
+class TestHasLikes:
+    def test_returns_like_state_for_every_post(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username = _random_user()
+            liked, not_liked, liked_by_other = _new_post(), _new_post(), _new_post()
+
+            for post in (liked, not_liked, liked_by_other):
+                _insert_post(connection, post)
+
+            _like_post(connection, liked, username)
+            _like_post(connection, liked_by_other, _random_user())
+            missing_id = max(liked["id"], not_liked["id"], liked_by_other["id"]) + 1
+
+            result = catalog.has_likes([liked["id"], not_liked["id"], liked_by_other["id"], missing_id], username)
+
+            want = {liked["id"]: True, not_liked["id"]: False, liked_by_other["id"]: False, missing_id: False}
+            assert result == want, "Wrong like states returned"
+
 
 class TestLike:
     def test_creates_like(self, engine: sqlalchemy.engine.Engine):
@@ -79,6 +217,7 @@ class TestLike:
             catalog.like(post["id"], username)
 
             _assert_liked(connection, post["id"], username)
+            _assert_like_count(connection, post["id"], 1)
 
     def test_with_non_existent_post(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
@@ -125,6 +264,98 @@ class TestLike:
                 catalog.like(post["id"], username)
 
 
+class TestApplyLikes:
+    def test_applies_requests_in_order(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username = _random_user()
+            other, own, liked = _new_post() | {"id": 1}, _new_post(username) | {"id": 2}, _new_post() | {"id": 3}
+
+            for post in (other, own, liked):
+                _insert_post(connection, post)
+
+            catalog.like(liked["id"], username)
+            requests = [
+                posts.LikeRequest(post_id=1),
+                posts.LikeRequest(post_id=1),
+                posts.LikeRequest(post_id=2),
+                posts.LikeRequest(post_id=3, action=posts.LikeAction.UNLIKE),
+                posts.LikeRequest(post_id=3, action=posts.LikeAction.UNLIKE),
+                posts.LikeRequest(post_id=4),
+            ]
+
+            results = catalog.apply_likes(username, requests)
+
+            assert results == [
+                posts.LikeResult.OK,
+                posts.LikeResult.ALREADY_LIKED,
+                posts.LikeResult.AUTHOR_LIKED,
+                posts.LikeResult.OK,
+                posts.LikeResult.NOT_LIKED,
+                posts.LikeResult.NOT_FOUND,
+            ], "Wrong results"
+            _assert_liked(connection, other["id"], username)
+            _assert_like_count(connection, other["id"], 1)
+            _assert_unliked(connection, liked["id"], username)
+            _assert_like_count(connection, liked["id"], 0)
+            assert catalog.analytics() == 1, "Likes were aggregated wrong"
+
+    def test_with_reverted_like(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username, post = _random_user(), _new_post()
+            _insert_post(connection, post)
+            requests = [
+                posts.LikeRequest(post_id=post["id"]),
+                posts.LikeRequest(post_id=post["id"], action=posts.LikeAction.UNLIKE),
+            ]
+
+            results = catalog.apply_likes(username, requests)
+
+            assert results == [posts.LikeResult.OK, posts.LikeResult.OK], "Wrong results"
+            _assert_unliked(connection, post["id"], username)
+            _assert_like_count(connection, post["id"], 0)
+            assert catalog.analytics() == 0, "Likes were aggregated wrong"
+
+    def test_with_concurrent_likes(self, tmp_path: pathlib.Path):
+        engine = tables.create_engine(f"sqlite+pysqlite:///{tmp_path / 'posts.db'}")
+        tables.metadata.create_all(engine)
+        username, liked, unliked = _random_user(), _new_post() | {"id": 1}, _new_post() | {"id": 2}
+
+        with engine.begin() as connection:
+            _insert_post(connection, liked)
+            _insert_post(connection, unliked)
+            posts.Catalog(connection).like(unliked["id"], username)
+
+        with engine.begin() as connection:
+            changed = []
+
+            def change_concurrently(*_):
+                if not changed:
+                    changed.append(True)
+
+                    with engine.begin() as other:
+                        posts.Catalog(other).like(liked["id"], username)
+                        posts.Catalog(other).unlike(unliked["id"], username)
+
+            sqlalchemy.event.listen(connection, "after_execute", change_concurrently)
+            requests = [
+                posts.LikeRequest(post_id=liked["id"]),
+                posts.LikeRequest(post_id=unliked["id"], action=posts.LikeAction.UNLIKE),
+            ]
+
+            results = posts.Catalog(connection).apply_likes(username, requests)
+
+        assert results == [posts.LikeResult.ALREADY_LIKED, posts.LikeResult.NOT_LIKED], "Wrong results"
+
+        with engine.connect() as connection:
+            _assert_like_count(connection, liked["id"], 1)
+            _assert_like_count(connection, unliked["id"], 0)
+            assert posts.Catalog(connection).analytics() == 1, "Likes were aggregated wrong"
+
+        engine.dispose()
+
+
 class TestUnlike:
     def test_deletes_like(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
@@ -138,6 +369,46 @@ class TestUnlike:
 
             _assert_unliked(connection, post["id"], username)
 
+    def test_reads_like_date_while_deleting(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username, post = _random_user(), _new_post()
+            _insert_post(connection, post)
+            catalog.like(post["id"], username)
+            statements = []
+            sqlalchemy.event.listen(connection, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+            catalog.unlike(post["id"], username)
+
+            assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")], "Like was read separately"
+            assert catalog.analytics() == 0, "Daily likes were not decremented"
+
+    def test_keeps_likes_from_other_users(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username, other = _random_user(), _random_user()
+            post = _new_post()
+            _insert_post(connection, post)
+            catalog.like(post["id"], username)
+            catalog.like(post["id"], other)
+
+            catalog.unlike(post["id"], username)
+
+            _assert_unliked(connection, post["id"], username)
+            _assert_liked(connection, post["id"], other)
+            _assert_like_count(connection, post["id"], 1)
+
+    def test_with_like_from_another_user(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            username = _random_user()
+            post = _new_post()
+            _insert_post(connection, post)
+            _like_post(connection, post, _random_user())
+
+            with pytest.raises(posts.NotLiked):
+                catalog.unlike(post["id"], username)
+
     def test_with_unliked_post(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
             catalog = posts.Catalog(connection)
@@ -149,6 +420,54 @@ class TestUnlike:
                 catalog.unlike(post["id"], username)
 
 
+class TestExport:
+    def test_exports_posts_in_range(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            posts_ = [_new_post() | {"id": i} for i in range(1, 6)]
+
+            for post in posts_:
+                _insert_post(connection, post)
+
+            assert list(catalog.export_posts(batch_size=2)) == posts_, "Wrong posts exported"
+            assert list(catalog.export_posts(2, 4, batch_size=2)) == posts_[1:4], "Wrong posts range exported"
+
+    def test_exports_likes_in_range(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post, username = _new_post(), _random_user()
+            _insert_post(connection, post)
+            dates = [datetime.date(2022, 1, day) for day in (1, 2, 3)]
+
+            for date in dates:
+                _like_post_date(connection, post | {"id": post["id"] + date.day}, username, date)
+
+            exported = list(catalog.export_likes(dates[1], dates[2]))
+
+            assert exported == [
+                {"user": username, "post": post["id"] + date.day, "date": date} for date in dates[1:]
+            ], "Wrong likes exported"
+
+
+class TestRecountLikes:
+    def test_repairs_like_counts(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post, unliked_post = _new_post(), _new_post()
+            _insert_post(connection, post)
+            _insert_post(connection, unliked_post)
+            count = fake.pyint(min_value=1, max_value=10)
+
+            for _ in range(count):
+                _like_post(connection, post, _random_user())
+
+            repaired = catalog.recount_likes()
+
+            assert repaired == 1, "Wrong number of posts repaired"
+            _assert_like_count(connection, post["id"], count)
+            _assert_like_count(connection, unliked_post["id"], 0)
+
+
 class TestAnalytics:
     def test_aggregates_likes(self, engine: sqlalchemy.engine.Engine):
         with engine.begin() as connection:
@@ -160,6 +479,7 @@ class TestAnalytics:
             for _ in range(count):
                 _like_post(connection, post, _random_user())
 
+            catalog.rebuild_daily_likes()
             likes = catalog.analytics()
 
             assert likes == count, "Likes were aggregated wrong"
@@ -179,6 +499,7 @@ class TestAnalytics:
             for _ in range(fake.pyint(min_value=1, max_value=10)):
                 _like_post_date(connection, post, _random_user(), fake.date_object(date_from))
 
+            catalog.rebuild_daily_likes()
             likes = catalog.analytics(date_from, date_to)
 
             assert likes == count, "Likes were aggregated wrong"
@@ -198,6 +519,7 @@ class TestAnalytics:
             for _ in range(count):
                 _like_post_date(connection, post, _random_user(), fake.future_date())
 
+            catalog.rebuild_daily_likes()
             likes = catalog.analytics(None, date_to)
 
             assert likes == count, "Likes were aggregated wrong"
@@ -217,10 +539,331 @@ class TestAnalytics:
             for _ in range(count):
                 _like_post_date(connection, post, _random_user(), fake.future_date())
 
+            catalog.rebuild_daily_likes()
             likes = catalog.analytics(date_from, None)
 
             assert likes == 2 * count, "Likes were aggregated wrong"
 
+    def test_counts_likes_incrementally(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            usernames = [_random_user() for _ in range(fake.pyint(min_value=2, max_value=10))]
+            today = datetime.datetime.utcnow().date()
+
+            for username in usernames:
+                catalog.like(post["id"], username)
+
+            catalog.unlike(post["id"], usernames[0])
+
+            assert catalog.analytics(today, today) == len(usernames) - 1, "Likes were aggregated wrong"
+            assert catalog.analytics(None, today - datetime.timedelta(days=1)) == 0, "Likes were aggregated wrong"
+
+
+class TestCachedPosts:
+    def test_reads_post_content_through_cache(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            post_cache = cache.Cache(maxsize=10)
+            catalog = posts.Catalog(connection, post_cache=post_cache)
+            post = _new_post()
+            _insert_post(connection, post)
+            catalog.get(post["id"])
+            connection.execute(sqlalchemy.text("UPDATE posts SET title = 'changed', like_count = 3"))
+
+            result = catalog.get_for_viewer(post["id"], None)
+
+            _assert_post(result, post | {"like_count": 3, "liked": False})
+            assert post_cache.stats == cache.Stats(hits=1, misses=1), "Wrong cache stats"
+
+    def test_keeps_liked_post_cached(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            post_cache = cache.Cache(maxsize=10)
+            catalog = posts.Catalog(connection, post_cache=post_cache)
+            username, post = _random_user(), _new_post()
+            _insert_post(connection, post)
+            catalog.get(post["id"])
+
+            catalog.like(post["id"], username)
+
+            _assert_post(catalog.get_for_viewer(post["id"], username), post | {"like_count": 1, "liked": True})
+            assert post_cache.stats == cache.Stats(hits=1, misses=1), "Liked post was dropped from cache"
+
+    def test_reads_fresh_like_count(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            post_cache = cache.Cache(maxsize=10)
+            catalog = posts.Catalog(connection, post_cache=post_cache)
+            username, post = _random_user(), _new_post()
+            _insert_post(connection, post)
+            catalog.get_for_viewer(post["id"], username)
+
+            catalog.like(post["id"], username)
+
+            _assert_post(catalog.get_for_viewer(post["id"], username), post | {"like_count": 1, "liked": True})
+            catalog.unlike(post["id"], username)
+            _assert_post(catalog.get(post["id"]), post)
+
+    def test_returns_copies(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection, post_cache=cache.Cache(maxsize=10))
+            post = _new_post()
+            _insert_post(connection, post)
+
+            catalog.get(post["id"]).clear()
+
+            _assert_post(catalog.get(post["id"]), post)
+
+    def test_reads_committed_like_count(self, tmp_path: pathlib.Path):
+        engine = tables.create_engine(f"sqlite+pysqlite:///{tmp_path / 'posts.db'}")
+        tables.metadata.create_all(engine)
+        post_cache = cache.Cache(maxsize=10)
+        username, post = _random_user(), _new_post()
+
+        with engine.begin() as connection:
+            _insert_post(connection, post)
+
+        with engine.begin() as connection:
+            posts.Catalog(connection, post_cache=post_cache).like(post["id"], username)
+
+            with engine.connect() as reader:
+                _assert_post(posts.Catalog(reader, post_cache=post_cache).get(post["id"]), post)
+
+        with engine.connect() as connection:
+            _assert_post(posts.Catalog(connection, post_cache=post_cache).get(post["id"]), post | {"like_count": 1})
+
+        engine.dispose()
+
+
+class TestCachedAnalytics:
+    def test_caches_aggregated_likes(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            analytics_cache = cache.Cache(maxsize=10)
+            catalog = posts.Catalog(connection, analytics_cache)
+            post = _new_post()
+            _insert_post(connection, post)
+            date = fake.past_date()
+            _like_post_date(connection, post, _random_user(), date)
+            catalog.rebuild_daily_likes()
+            catalog.analytics(date, date)
+            _like_post_date(connection, post, _random_user(), date)
+
+            likes = catalog.analytics(date, date)
+
+            assert likes == 1, "Likes were not cached"
+            assert analytics_cache.stats == cache.Stats(hits=1, misses=1), "Wrong cache stats"
+
+    def test_expires_closed_ranges(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            now = [0.0]
+            analytics_cache = cache.Cache(maxsize=10, ttl=5, clock=lambda: now[0])
+            catalog = posts.Catalog(connection, analytics_cache)
+            date = fake.past_date()
+            catalog.analytics(date, date)
+            connection.execute(sqlalchemy.insert(tables.likes_daily).values(date=date, likes=1))
+
+            now[0] += 5
+            cached = catalog.analytics(date, date)
+            now[0] += posts.ANALYTICS_CLOSED_TTL
+            expired = catalog.analytics(date, date)
+
+            assert cached == 0, "Closed range expired with open ranges"
+            assert expired == 1, "Closed range never expired"
+
+    def test_invalidates_ranges_with_new_likes(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            analytics_cache = cache.Cache(maxsize=10)
+            catalog = posts.Catalog(connection, analytics_cache)
+            post = _new_post()
+            _insert_post(connection, post)
+            today = datetime.datetime.utcnow().date()
+            yesterday = today - datetime.timedelta(days=1)
+            catalog.analytics(None, None)
+            catalog.analytics(None, yesterday)
+
+            catalog.like(post["id"], _random_user())
+
+            assert catalog.analytics(None, None) == 1, "Range with a new like was not invalidated"
+            assert catalog.analytics(None, yesterday) == 0, "Wrong likes aggregated"
+            assert analytics_cache.stats == cache.Stats(hits=1, misses=3), "Wrong cache stats"
+
+    def test_invalidates_ranges_after_commit(self, tmp_path: pathlib.Path):
+        engine = tables.create_engine(f"sqlite+pysqlite:///{tmp_path / 'posts.db'}")
+        tables.metadata.create_all(engine)
+        analytics_cache = cache.Cache(maxsize=10)
+        username, post, date = _random_user(), _new_post(), fake.past_date()
+
+        with engine.begin() as connection:
+            _insert_post(connection, post)
+            _like_post_date(connection, post, username, date)
+            posts.Catalog(connection).rebuild_daily_likes()
+
+        with engine.begin() as connection:
+            posts.Catalog(connection, analytics_cache).unlike(post["id"], username)
+
+            with engine.connect() as reader:
+                assert posts.Catalog(reader, analytics_cache).analytics(date, date) == 1, "Uncommitted unlike was read"
+
+        with engine.connect() as connection:
+            assert posts.Catalog(connection, analytics_cache).analytics(date, date) == 0, "Stale likes were cached"
+
+        engine.dispose()
+
+
+class TestAnalyticsSeries:
+    def test_groups_likes_by_day(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            start = fake.date_object()
+            _like_post_date(connection, post, _random_user(), start)
+            _like_post_date(connection, post, _random_user(), start)
+            _like_post_date(connection, post, _random_user(), start + datetime.timedelta(days=2))
+            catalog.rebuild_daily_likes()
+
+            series = catalog.analytics_series(start, start + datetime.timedelta(days=3), posts.Bucket.DAY)
+
+            want = [(start + datetime.timedelta(days=i), n) for i, n in enumerate((2, 0, 1, 0))]
+            assert series == want, "Likes were aggregated wrong"
+
+    def test_groups_likes_by_week(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            monday = datetime.date(2022, 4, 4)
+            _like_post_date(connection, post, _random_user(), monday + datetime.timedelta(days=6))
+            _like_post_date(connection, post, _random_user(), monday + datetime.timedelta(days=14))
+            catalog.rebuild_daily_likes()
+
+            series = catalog.analytics_series(None, None, posts.Bucket.WEEK)
+
+            want = [(monday + datetime.timedelta(weeks=i), n) for i, n in enumerate((1, 0, 1))]
+            assert series == want, "Likes were aggregated wrong"
+
+    def test_groups_likes_by_month(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            _like_post_date(connection, post, _random_user(), datetime.date(2021, 12, 31))
+            _like_post_date(connection, post, _random_user(), datetime.date(2022, 2, 1))
+            _like_post_date(connection, post, _random_user(), datetime.date(2022, 2, 28))
+            catalog.rebuild_daily_likes()
+
+            series = catalog.analytics_series(
+                datetime.date(2021, 12, 15), datetime.date(2022, 3, 1), posts.Bucket.MONTH
+            )
+
+            months = (
+                datetime.date(2021, 12, 1),
+                datetime.date(2022, 1, 1),
+                datetime.date(2022, 2, 1),
+                datetime.date(2022, 3, 1),
+            )
+            assert series == list(zip(months, (1, 0, 2, 0))), "Likes were aggregated wrong"
+
+    def test_without_likes(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+
+            series = catalog.analytics_series()
+
+            assert series == [], "Likes were aggregated wrong"
+
+    def test_with_too_many_buckets(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            start = datetime.date(2022, 1, 1)
+
+            with pytest.raises(posts.TooManyBuckets):
+                catalog.analytics_series(start, datetime.date(2022, 4, 1), posts.Bucket.MONTH, max_buckets=3)
+
+            series = catalog.analytics_series(start, datetime.date(2022, 3, 31), posts.Bucket.MONTH, max_buckets=3)
+
+            assert [date for date, _ in series] == [
+                start,
+                start.replace(month=2),
+                start.replace(month=3),
+            ], "Wrong periods"
+
+    def test_up_to_last_date(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+
+            for bucket in posts.Bucket:
+                series = catalog.analytics_series(datetime.date(9999, 11, 1), datetime.date.max, bucket)
+
+                assert series[-1] == (bucket.start(datetime.date.max), 0), "Series did not end at the last date"
+
+
+class TestRebuildDailyLikes:
+    def test_rolls_up_likes_by_day(self, engine: sqlalchemy.engine.Engine):
+        with engine.begin() as connection:
+            catalog = posts.Catalog(connection)
+            post = _new_post()
+            _insert_post(connection, post)
+            dates = [fake.date_object() for _ in range(fake.pyint(min_value=1, max_value=10))]
+
+            for date in dates:
+                _like_post_date(connection, post, _random_user(), date)
+
+            days = catalog.rebuild_daily_likes()
+
+            assert days == len(set(dates)), "Wrong number of days rolled up"
+            for date in set(dates):
+                assert catalog.analytics(date, date) == dates.count(date), "Likes were aggregated wrong"
+
+
+class TestAsyncCatalog:
+    async def test_making_and_liking_post(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            catalog = posts.AsyncCatalog(connection)
+            author, username = _random_user(), _random_user()
+            request = _new_post_request()
+
+            post_id = await catalog.make_post(author, request)
+            await catalog.like(post_id, username)
+
+            post = await catalog.get(post_id)
+            assert post is not None and post.pop("like_count") == 1, "Wrong post like count"
+            _assert_post_saved(post_id, author, request, post)
+            assert await catalog.has_like(post_id, username) is True, "Post does not have like from user"
+
+    async def test_exporting_posts(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            catalog = posts.AsyncCatalog(connection)
+            author, request = _random_user(), _new_post_request()
+            post_ids = await catalog.make_posts(author, [request] * 3)
+
+            exported = [post["id"] async for post in catalog.export_posts(post_ids[1], batch_size=1)]
+
+            assert exported == post_ids[1:], "Wrong posts exported"
+
+    async def test_counts_cache_lookups_once(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            post_cache = cache.Cache(maxsize=10)
+            catalog = posts.AsyncCatalog(connection, post_cache=post_cache)
+            post_id = await catalog.make_post(_random_user(), _new_post_request())
+
+            await catalog.get_for_viewer(post_id, _random_user())
+            await catalog.get_for_viewer(post_id, _random_user())
+            await catalog.get(post_id)
+
+            assert post_cache.stats == cache.Stats(hits=2, misses=1), "Wrong cache stats"
+
+    async def test_unliking_post(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            catalog = posts.AsyncCatalog(connection)
+            username = _random_user()
+            post_id = await catalog.make_post(_random_user(), _new_post_request())
+            await catalog.like(post_id, username)
+
+            await catalog.unlike(post_id, username)
+
+            assert await catalog.has_like(post_id, username) is False, "Post still has a like from user"
+            assert await catalog.analytics() == 0, "Likes were aggregated wrong"
+
 
 def _random_user() -> str:
     return fake.pystr()
@@ -239,6 +882,7 @@ def _new_post(author: str | None = None) -> dict:
         "author": author,
         "title": fake.pystr(),
         "description": fake.pystr(),
+        "like_count": 0,
     }
 
 
@@ -289,3 +933,9 @@ def _assert_unliked(connection: base.Connection, post_id: posts.ID, username: st
     text = "SELECT 1 FROM likes WHERE likes.post == :post_id AND likes.user == :username"
     select = sqlalchemy.text(text).bindparams(post_id=post_id, username=username)
     assert bool(connection.execute(select).fetchone()) is False, "Post still has a like from user"
+
+
+def _assert_like_count(connection: base.Connection, post_id: posts.ID, want: int):
+    text = "SELECT like_count FROM posts WHERE posts.id == :post_id"
+    have = connection.execute(sqlalchemy.text(text).bindparams(post_id=post_id)).scalar()
+    assert have == want, f"Wrong like count\nhave {have}\nwant {want}"
@@ -0,0 +1,31 @@
+import pathlib
+
+import sqlalchemy
+
+import tables
+
+
+def test_file_engine_applies_pragmas(tmp_path: pathlib.Path):
+    engine = tables.create_engine(f"sqlite+pysqlite:///{tmp_path / 'posts.db'}", pool_size=2)
+
+    with engine.connect() as connection:
+        assert _pragma(connection, "journal_mode") == "wal", "Database is not in WAL mode"
+        assert _pragma(connection, "busy_timeout") == tables.SQLITE_BUSY_TIMEOUT, "Wrong busy timeout"
+        assert _pragma(connection, "cache_size") == tables.SQLITE_CACHE_SIZE, "Wrong cache size"
+
+    assert engine.pool.size() == 2, "Wrong pool size"
+
+
+def test_memory_engine_shares_database():
+    engine = tables.create_engine("sqlite+pysqlite:///:memory:")
+
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("CREATE TABLE shared (id INTEGER)"))
+
+    with engine.connect() as connection:
+        assert _pragma(connection, "busy_timeout") == tables.SQLITE_BUSY_TIMEOUT, "Wrong busy timeout"
+        connection.execute(sqlalchemy.text("SELECT * FROM shared"))
+
+
+def _pragma(connection: sqlalchemy.engine.Connection, name: str):
+    return connection.execute(sqlalchemy.text(f"PRAGMA {name}")).scalar()
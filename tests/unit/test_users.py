@@ -8,7 +8,10 @@ from jose import jwt
 import pytest
 import sqlalchemy
 from sqlalchemy.engine import base
+from sqlalchemy.ext import asyncio
 
+import cache
+import hashing
 import tables
 import users
 
@@ -60,6 +63,28 @@ class TestLogin:
             with pytest.raises(users.Unauthorized):
                 registry.login(username, fake.pystr())
 
+    def test_rehashes_legacy_hash(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection, hasher=hashing.PBKDF2Hasher(1000))
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+
+            registry.login(username, password)
+
+            _assert_registered(connection, username, password)
+            assert not hashing.needs_rehash(_password_hash(connection, username), hashing.PBKDF2Hasher(1000))
+
+    def test_rehashes_with_other_algorithm(self):
+        with engine.begin() as connection:
+            username, password = fake.pystr(), fake.pystr()
+            users.Registry(connection, hasher=hashing.PBKDF2Hasher(1000)).signup(username, password)
+            hasher = hashing.ScryptHasher(2**10)
+
+            users.Registry(connection, hasher=hasher).login(username, password)
+
+            _assert_registered(connection, username, password)
+            assert _password_hash(connection, username).startswith("scrypt$1024$"), "Password was not rehashed"
+
     def test_with_non_existent_user(self):
         with engine.begin() as connection:
             registry = users.Registry(connection)
@@ -122,6 +147,115 @@ class TestAuthenticate:
                 registry.authenticate(token)
 
 
+class TestRefreshTokens:
+    def test_refreshing_access_token(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            refresh_token = registry.issue_refresh_token(username)
+
+            token, rotated = registry.refresh(refresh_token)
+
+            _assert_token(token, username)
+            assert rotated != refresh_token, "Refresh token was not rotated"
+            assert registry.refresh(rotated)[0], "Rotated token was not accepted"
+
+    def test_with_used_token(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            refresh_token = registry.issue_refresh_token(username)
+            registry.refresh(refresh_token)
+
+            with pytest.raises(users.Unauthorized):
+                registry.refresh(refresh_token)
+
+    def test_with_expired_token(self, monkeypatch: pytest.MonkeyPatch):
+        with engine.begin() as connection:
+            registry = users.Registry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            monkeypatch.setattr(users, "REFRESH_TOKEN_LIFETIME", -1)
+            refresh_token = registry.issue_refresh_token(username)
+
+            with pytest.raises(users.Unauthorized):
+                registry.refresh(refresh_token)
+
+    def test_with_revoked_tokens(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            revoked, other = registry.issue_refresh_token(username), registry.issue_refresh_token(username)
+
+            registry.revoke_refresh_token(revoked)
+
+            with pytest.raises(users.Unauthorized):
+                registry.refresh(revoked)
+
+            registry.revoke_refresh_tokens(username)
+
+            with pytest.raises(users.Unauthorized):
+                registry.refresh(other)
+
+    def test_stores_only_digest(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+
+            refresh_token = registry.issue_refresh_token(username)
+
+            select = sqlalchemy.select(tables.refresh_tokens.c.digest).where(
+                tables.refresh_tokens.c.username == username
+            )
+            assert connection.execute(select).scalar_one() == hashlib.sha256(refresh_token.encode()).digest()
+
+
+class TestCachedAuthenticate:
+    def test_caches_verified_token(self):
+        with engine.begin() as connection:
+            token_cache = cache.Cache(maxsize=10)
+            registry = users.Registry(connection, token_cache)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            token = _encode_token(username)
+            registry.authenticate(token)
+            _delete_user(connection, username)
+
+            have = registry.authenticate(token)
+
+            assert have == username, "Token was not cached"
+            assert token_cache.stats.hits == 1, "Token cache was not hit"
+
+    def test_invalidating_user_tokens(self):
+        with engine.begin() as connection:
+            registry = users.Registry(connection, cache.Cache(maxsize=10))
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+            token = _encode_token(username)
+            registry.authenticate(token)
+            _delete_user(connection, username)
+
+            registry.invalidate_tokens(username)
+
+            with pytest.raises(users.Unauthorized):
+                registry.authenticate(token)
+
+    def test_does_not_cache_invalid_token(self):
+        with engine.begin() as connection:
+            token_cache = cache.Cache(maxsize=10)
+            registry = users.Registry(connection, token_cache)
+            token = _encode_token(fake.pystr())
+
+            with pytest.raises(users.Unauthorized):
+                registry.authenticate(token)
+
+            assert len(token_cache) == 0, "Invalid token was cached"
+
+
 class TestTrackActivity:
     def test_records_activity_time(self):
         with engine.begin() as connection:
@@ -134,6 +268,56 @@ class TestTrackActivity:
             _assert_tracked(connection, username)
 
 
+class TestBufferedActivity:
+    def test_buffers_activity_until_flush(self):
+        with engine.begin() as connection:
+            buffer = users.ActivityBuffer(maxsize=10)
+            registry = users.Registry(connection, activity_buffer=buffer)
+            username, password = fake.pystr(), fake.pystr()
+            _insert_user(connection, username, password)
+
+            registry.track_activity(username)
+
+            _assert_not_tracked(connection, username)
+            _, activity = registry.get_activities(username)
+            assert activity == buffer.get(username), "Buffered activity was not returned"
+
+            assert buffer.flush(connection) == 1, "Wrong number of activities flushed"
+            _assert_tracked(connection, username)
+            assert len(buffer) == 0, "Buffer was not emptied"
+
+    def test_reports_full_buffer(self):
+        with engine.begin() as connection:
+            buffer = users.ActivityBuffer(maxsize=2)
+            registry = users.Registry(connection, activity_buffer=buffer)
+            usernames = [fake.pystr(), fake.pystr()]
+
+            for username in usernames:
+                _insert_user(connection, username, fake.pystr())
+
+            assert registry.track_activity(usernames[0]) is False, "Buffer was reported full too early"
+            assert registry.track_activity(usernames[1]) is True, "Full buffer was not reported"
+
+            for username in usernames:
+                _assert_not_tracked(connection, username)
+
+            assert buffer.flush(connection) == 2, "Wrong number of activities flushed"
+
+    def test_keeps_newer_activity(self):
+        with engine.begin() as connection:
+            buffer = users.ActivityBuffer(maxsize=10)
+            username = fake.pystr()
+            _insert_user(connection, username, fake.pystr())
+            last_activity = datetime.datetime.utcnow()
+            _update_tracks(connection, username, last_activity, last_activity)
+
+            buffer.track(username, last_activity - datetime.timedelta(minutes=1))
+            buffer.flush(connection)
+
+            _, activity = users.Registry(connection).get_activities(username)
+            assert activity == last_activity, "Newer activity was overwritten"
+
+
 class TestGetActivities:
     def test_returns_last_login_and_last_activity(self):
         with engine.begin() as connection:
@@ -149,6 +333,41 @@ class TestGetActivities:
             assert activity == last_activity, "Wrong last activity returned"
 
 
+class TestAsyncRegistry:
+    async def test_signup_and_login(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            registry = users.AsyncRegistry(connection)
+            username, password = fake.pystr(), fake.pystr()
+
+            await registry.signup(username, password)
+            token = await registry.login(username, password)
+
+            _assert_token(token, username)
+            assert await registry.authenticate(token) == username, "Got wrong username from token"
+
+    async def test_with_wrong_password(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            registry = users.AsyncRegistry(connection)
+            username, password = fake.pystr(), fake.pystr()
+            await registry.signup(username, password)
+
+            with pytest.raises(users.Unauthorized):
+                await registry.login(username, fake.pystr())
+
+    async def test_counts_token_cache_lookups_once(self, async_engine: asyncio.AsyncEngine):
+        async with async_engine.begin() as connection:
+            token_cache = cache.Cache(maxsize=10)
+            registry = users.AsyncRegistry(connection, token_cache)
+            username, password = fake.pystr(), fake.pystr()
+            await registry.signup(username, password)
+            token = await registry.login(username, password)
+
+            await registry.authenticate(token)
+            await registry.authenticate(token)
+
+            assert token_cache.stats == cache.Stats(hits=1, misses=1), "Wrong token cache stats"
+
+
 def _insert_user(connection: base.Connection, username: str, password: str):
     salt = os.urandom(32)
     password_hash = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100_000, 128)
@@ -157,6 +376,11 @@ def _insert_user(connection: base.Connection, username: str, password: str):
     connection.execute(insert)
 
 
+def _delete_user(connection: base.Connection, username: str):
+    text = "DELETE FROM users WHERE users.username = :username"
+    connection.execute(sqlalchemy.text(text).bindparams(username=username))
+
+
 def _update_tracks(connection: base.Connection, username: str, last_login: datetime.datetime, last_activity: datetime.datetime):
     text = "UPDATE users SET last_login = :last_login, last_activity = :last_activity WHERE users.username = :username"
     update = sqlalchemy.text(text).bindparams(last_login=last_login, last_activity=last_activity, username=username)
@@ -175,11 +399,14 @@ def _assert_registered(connection: base.Connection, username: str, password: str
     select = sqlalchemy.text(text).bindparams(username=username)
     result = connection.execute(select).fetchone()
     assert result is not None, "User has not been registered"
-    username, password_hash, salt = result
+    username, password_hash, _ = result
     assert username == username, "Wrong username saved"
-    assert password_hash == hashlib.pbkdf2_hmac(
-        "sha256", password.encode(), salt, 100_000, 128
-    ), "Wrong password hash saved"
+    assert hashing.verify(password, password_hash), "Wrong password hash saved"
+
+
+def _password_hash(connection: base.Connection, username: str) -> str:
+    text = "SELECT password FROM users WHERE users.username == :username"
+    return connection.execute(sqlalchemy.text(text).bindparams(username=username)).scalar_one()
 
 
 def _assert_token(token: str, username: str):
@@ -207,6 +434,12 @@ def _assert_login_tracked(connection: base.Connection, username: str):
     assert have == datetime.datetime.utcnow().replace(microsecond=0), "Wrong datetime tracked"
 
 
+def _assert_not_tracked(connection: base.Connection, username: str):
+    text = "SELECT last_activity FROM users WHERE users.username == :username"
+    select = sqlalchemy.text(text).bindparams(username=username)
+    assert connection.execute(select).scalar() is None, "Activity has been tracked"
+
+
 def _assert_tracked(connection: base.Connection, username: str):
     text = "SELECT last_activity FROM users WHERE users.username == :username"
     select = sqlalchemy.text(text).bindparams(username=username)
@@ -1,16 +1,18 @@
 from __future__ import annotations
 import datetime
+import json
 
 from typing import TYPE_CHECKING
 
 import faker
 import httpx
+import pytest
 
-from web import users
+import posts
+from web import analytics as web_analytics, posts as web_posts, users
 
 if TYPE_CHECKING:
     from tests.conftest import StubPostsCatalog, StubUsersRegistry
-    import posts
 
 fake = faker.Faker()
 
@@ -29,13 +31,21 @@ class TestPOSTSignup:
 
     async def test_with_existing_user(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
         request = _random_signup_request()
-        registry.signup(request["username"], request["password"])
+        await registry.signup(request["username"], request["password"])
 
         resp = await _signup(client, request)
 
         _assert_code(resp, httpx.codes.BAD_REQUEST)
         _assert_body(resp, {"detail": users.USER_EXISTS_ERROR})
 
+    async def test_with_overloaded_hashing(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        registry.overloaded = True
+
+        resp = await _signup(client, _random_signup_request())
+
+        _assert_code(resp, httpx.codes.SERVICE_UNAVAILABLE)
+        _assert_body(resp, {"detail": users.OVERLOADED_ERROR})
+
 
 class TestPOSTLogin:
     """Tests user login."""
@@ -48,7 +58,8 @@ class TestPOSTLogin:
         resp = await _login(client, request)
 
         _assert_code(resp, httpx.codes.OK)
-        _assert_body(resp, {"access_token": token, "token_type": "bearer"})
+        refresh_token = resp.json()["refresh_token"]
+        _assert_body(resp, {"access_token": token, "refresh_token": refresh_token, "token_type": "bearer"})
         _assert_activity_tracked(registry, user["username"])
 
     async def test_with_wrong_token(self, client: httpx.AsyncClient):
@@ -60,6 +71,44 @@ class TestPOSTLogin:
 
         _assert_code(resp, httpx.codes.UNAUTHORIZED)
 
+    async def test_with_overloaded_hashing(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        user = _random_user()
+        registry.add_user(user)
+        registry.overloaded = True
+
+        resp = await _login(client, _new_login_request(user))
+
+        _assert_code(resp, httpx.codes.SERVICE_UNAVAILABLE)
+        _assert_body(resp, {"detail": users.OVERLOADED_ERROR})
+
+
+class TestPOSTRefreshToken:
+    async def test_refreshing_token(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        refresh_token = await registry.issue_refresh_token(fake.pystr())
+
+        resp = await client.post("/users/token/refresh", json={"refresh_token": refresh_token})
+
+        _assert_code(resp, httpx.codes.OK)
+        body = resp.json()
+        assert await registry.authenticate(body["access_token"]), "Access token was not issued"
+        assert body["refresh_token"] != refresh_token, "Refresh token was not rotated"
+        assert body["token_type"] == "bearer", "Wrong token type"
+
+    async def test_with_unknown_token(self, client: httpx.AsyncClient):
+        resp = await client.post("/users/token/refresh", json={"refresh_token": fake.pystr()})
+
+        _assert_code(resp, httpx.codes.UNAUTHORIZED)
+
+
+class TestPOSTRevokeToken:
+    async def test_revoking_token(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        refresh_token = await registry.issue_refresh_token(fake.pystr())
+
+        resp = await client.post("/users/token/revoke", json={"refresh_token": refresh_token})
+
+        _assert_code(resp, httpx.codes.NO_CONTENT)
+        assert registry.revoked == [refresh_token], "Token was not revoked"
+
 
 class TestGETUserActivity:
     async def test_retrieving_user_activity(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
@@ -111,6 +160,166 @@ class TestPOSTPosts:
         _assert_body(resp, {"detail": "Forbidden"})
 
 
+class TestPOSTPostsBatch:
+    """Test posts batch POST endpoint."""
+
+    async def test_creating_posts(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, registry: StubUsersRegistry
+    ):
+        requests = [_random_post_request() for _ in range(2)]
+        username = _authorize(client, registry)
+
+        resp = await client.post("/posts/batch", json=requests)
+
+        _assert_code(resp, httpx.codes.CREATED)
+        _assert_body(resp, {"posts": [{"id": 1, "location": "/posts/1"}, {"id": 2, "location": "/posts/2"}]})
+        assert catalog.post_calls == [(username, r) for r in requests], "Wrong posts made"
+
+    async def test_with_too_large_batch(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, registry: StubUsersRegistry
+    ):
+        _authorize(client, registry)
+        requests = [_random_post_request() for _ in range(web_posts.MAX_BATCH_SIZE + 1)]
+
+        resp = await client.post("/posts/batch", json=requests)
+
+        _assert_code(resp, httpx.codes.REQUEST_ENTITY_TOO_LARGE)
+        assert catalog.post_calls == [], "Posts were made"
+
+    async def test_without_authorization(self, client: httpx.AsyncClient):
+        resp = await client.post("/posts/batch", json=[_random_post_request()])
+
+        _assert_code(resp, httpx.codes.UNAUTHORIZED)
+
+
+class TestGETPosts:
+    """Test posts listing GET endpoint."""
+
+    async def test_listing_pages(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        posts_ = [_random_post() | {"id": i} for i in range(1, 4)]
+
+        for post in posts_:
+            catalog.add_post(post)
+
+        resp = await client.get("/posts", params={"limit": 2})
+
+        _assert_code(resp, httpx.codes.OK)
+        want_links = [{"rel": "next", "href": "/posts?after=2&limit=2", "action": "GET"}]
+        _assert_body(resp, {"posts": [p | {"links": []} for p in posts_[:2]], "links": want_links})
+
+        resp = await client.get(resp.json()["links"][0]["href"])
+
+        _assert_code(resp, httpx.codes.OK)
+        _assert_body(resp, {"posts": [posts_[2] | {"links": []}], "links": []})
+
+    async def test_with_user_likes(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, registry: StubUsersRegistry
+    ):
+        username = _authorize(client, registry)
+        liked, other, own = _random_post() | {"id": 1}, _random_post() | {"id": 2}, _random_post(username) | {"id": 3}
+
+        for post in (liked, other, own):
+            catalog.add_post(post)
+
+        catalog.add_like(username, liked["id"])
+
+        resp = await client.get("/posts")
+
+        _assert_code(resp, httpx.codes.OK)
+        want_posts = [
+            liked | {"links": [{"rel": "unlike", "href": "/posts/1/like", "action": "DELETE"}]},
+            other | {"links": [{"rel": "like", "href": "/posts/2/like", "action": "POST"}]},
+            own | {"links": []},
+        ]
+        _assert_body(resp, {"posts": want_posts, "links": []})
+
+    async def test_with_too_large_page(self, client: httpx.AsyncClient):
+        resp = await client.get("/posts", params={"limit": web_posts.MAX_PAGE_SIZE + 1})
+
+        _assert_code(resp, httpx.codes.UNPROCESSABLE_ENTITY)
+
+
+class TestGETAuthorPosts:
+    """Test author posts listing GET endpoint."""
+
+    async def test_listing_pages(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        author = fake.pystr()
+        posts_ = [_random_post(author) | {"id": i} for i in range(1, 4)]
+
+        for post in posts_ + [_random_post() | {"id": 4}]:
+            catalog.add_post(post)
+
+        resp = await client.get(f"/users/{author}/posts", params={"limit": 2})
+
+        _assert_code(resp, httpx.codes.OK)
+        want_links = [{"rel": "next", "href": f"/users/{author}/posts?before=2&limit=2", "action": "GET"}]
+        _assert_body(resp, {"posts": [p | {"links": []} for p in posts_[:0:-1]], "links": want_links})
+
+        resp = await client.get(resp.json()["links"][0]["href"])
+
+        _assert_code(resp, httpx.codes.OK)
+        _assert_body(resp, {"posts": [posts_[0] | {"links": []}], "links": []})
+
+    async def test_with_unknown_author(self, client: httpx.AsyncClient):
+        resp = await client.get(f"/users/{fake.pystr()}/posts")
+
+        _assert_code(resp, httpx.codes.OK)
+        _assert_body(resp, {"posts": [], "links": []})
+
+
+class TestGETExports:
+    async def test_exporting_posts(
+        self,
+        client: httpx.AsyncClient,
+        catalog: StubPostsCatalog,
+        registry: StubUsersRegistry,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        _authorize_admin(client, registry, monkeypatch)
+        posts_ = [_random_post() | {"id": i} for i in range(1, 4)]
+
+        for post in posts_:
+            catalog.add_post(post)
+
+        resp = await client.get("/posts/export", params={"id_from": 2})
+
+        _assert_code(resp, httpx.codes.OK)
+        assert resp.headers["content-type"] == "application/x-ndjson", "Wrong content type"
+        assert [json.loads(line) for line in resp.text.splitlines()] == posts_[1:], "Wrong posts exported"
+
+    async def test_exporting_likes(
+        self,
+        client: httpx.AsyncClient,
+        catalog: StubPostsCatalog,
+        registry: StubUsersRegistry,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        _authorize_admin(client, registry, monkeypatch)
+        catalog.add_like("user", 1)
+        today = datetime.date.today()
+
+        resp = await client.get("/analytics/likes/export", params={"date_from": today.isoformat()})
+
+        _assert_code(resp, httpx.codes.OK)
+        want = [{"user": "user", "post": 1, "date": today.isoformat()}]
+        assert [json.loads(line) for line in resp.text.splitlines()] == want, "Wrong likes exported"
+
+    async def test_without_authorization(self, client: httpx.AsyncClient):
+        for path in ("/posts/export", "/analytics/likes/export"):
+            resp = await client.get(path)
+
+            _assert_code(resp, httpx.codes.UNAUTHORIZED)
+
+    async def test_with_non_admin_user(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        _authorize(client, registry)
+
+        for path in ("/posts/export", "/analytics/likes/export"):
+            resp = await client.get(path)
+
+            _assert_code(resp, httpx.codes.FORBIDDEN)
+            _assert_body(resp, {"detail": "Forbidden"})
+
+
 class TestGETPost:
     """Test post resource GET endpoint."""
 
@@ -171,6 +380,56 @@ class TestGETPost:
         _assert_activity_tracked(registry, username)
 
 
+class TestGETPostConditional:
+    """Test post resource conditional GET."""
+
+    async def test_anonymous_response_is_public(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        post = _random_post()
+        catalog.add_post(post)
+
+        resp = await _get_post(client, post["id"])
+
+        _assert_code(resp, httpx.codes.OK)
+        assert resp.headers["etag"] == f'"{post["id"]}-{post["like_count"]}-none"', "Wrong ETag"
+        assert resp.headers["cache-control"].startswith("public"), "Anonymous response is not public"
+
+    async def test_user_response_is_private(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, registry: StubUsersRegistry
+    ):
+        post = _random_post()
+        catalog.add_post(post)
+        username = _authorize(client, registry)
+        resp = await _get_post(client, post["id"])
+        catalog.add_like(username, post["id"])
+
+        liked_resp = await _get_post(client, post["id"])
+
+        assert resp.headers["cache-control"] == "private, no-cache", "User response is not private"
+        assert resp.headers["etag"] != liked_resp.headers["etag"], "ETag does not depend on user like"
+
+    async def test_not_modified(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        post = _random_post()
+        catalog.add_post(post)
+        etag = (await _get_post(client, post["id"])).headers["etag"]
+
+        resp = await client.get(f"/posts/{post['id']}", headers={"If-None-Match": f'"other", W/{etag}'})
+
+        _assert_code(resp, httpx.codes.NOT_MODIFIED)
+        assert resp.content == b"", "Body was sent"
+        assert resp.headers["etag"] == etag, "ETag was not sent"
+
+    async def test_modified(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        post = _random_post()
+        catalog.add_post(post)
+        etag = (await _get_post(client, post["id"])).headers["etag"]
+        post["like_count"] += 1
+
+        resp = await client.get(f"/posts/{post['id']}", headers={"If-None-Match": etag})
+
+        _assert_code(resp, httpx.codes.OK)
+        _assert_body(resp, post | {"links": []})
+
+
 class TestPOSTLikes:
     """Test post resource POST like endpoint."""
 
@@ -211,6 +470,37 @@ class TestPOSTLikes:
         _assert_activity_tracked(registry, username)
 
 
+class TestPOSTLikesBatch:
+    async def test_applying_likes(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, registry: StubUsersRegistry
+    ):
+        username = _authorize(client, registry)
+        post, own = _random_post() | {"id": 1}, _random_post(username) | {"id": 2}
+        catalog.add_post(post)
+        catalog.add_post(own)
+        requests = [
+            {"post_id": 1},
+            {"post_id": 1, "action": "like"},
+            {"post_id": 2},
+            {"post_id": 3, "action": "unlike"},
+            {"post_id": 1, "action": "unlike"},
+        ]
+
+        resp = await client.post("/posts/likes/batch", json=requests)
+
+        _assert_code(resp, httpx.codes.OK)
+        results = ["ok", "already_liked", "author_liked", "not_found", "ok"]
+        _assert_body(resp, {"results": [{"post_id": r["post_id"], "result": s} for r, s in zip(requests, results)]})
+        _assert_activity_tracked(registry, username)
+
+    async def test_with_too_large_batch(self, client: httpx.AsyncClient, registry: StubUsersRegistry):
+        _authorize(client, registry)
+
+        resp = await client.post("/posts/likes/batch", json=[{"post_id": 1}] * (web_posts.MAX_BATCH_SIZE + 1))
+
+        _assert_code(resp, httpx.codes.REQUEST_ENTITY_TOO_LARGE)
+
+
 class TestDELETELikes:
     """Test post resource DELETE like endpoint."""
 
@@ -276,6 +566,49 @@ class TestGETAnalytics:
         _assert_body(resp, {"likes": count})
         _assert_analytics(catalog, start, end)
 
+    async def test_grouping_by_period(self, client: httpx.AsyncClient, catalog: StubPostsCatalog):
+        start = fake.date_object()
+        end = start + datetime.timedelta(days=2)
+        catalog.series = [(start + datetime.timedelta(days=i), fake.pyint()) for i in range(3)]
+
+        resp = await _get_analytics(client, start, end, "day")
+
+        _assert_code(resp, httpx.codes.OK)
+        series = [{"date": d.isoformat(), "likes": n} for d, n in catalog.series]
+        _assert_body(resp, {"likes": sum(n for _, n in catalog.series), "series": series})
+        assert catalog.series_calls == [(start, end, posts.Bucket.DAY)], "Wrong analytics series call"
+
+    async def test_with_too_many_periods(
+        self, client: httpx.AsyncClient, catalog: StubPostsCatalog, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(web_analytics, "ANALYTICS_MAX_BUCKETS", 2)
+        start = fake.date_object()
+        catalog.series = [(start + datetime.timedelta(days=i), fake.pyint()) for i in range(3)]
+
+        resp = await _get_analytics(client, start, start + datetime.timedelta(days=2), "day")
+
+        _assert_code(resp, httpx.codes.UNPROCESSABLE_ENTITY)
+        _assert_body(resp, {"detail": "At most 2 periods can be grouped at once"})
+        assert catalog.max_buckets == 2, "Series length was not limited"
+
+    async def test_with_unknown_period(self, client: httpx.AsyncClient):
+        resp = await _get_analytics(client, None, None, "year")
+
+        _assert_code(resp, httpx.codes.UNPROCESSABLE_ENTITY)
+
+
+class TestGETMetrics:
+    async def test_retrieving_cache_stats(self, client: httpx.AsyncClient):
+        resp = await client.get("/metrics")
+
+        _assert_code(resp, httpx.codes.OK)
+        for name in ("analytics_cache", "token_cache"):
+            assert set(resp.json()[name]) == {"hits", "misses", "evictions"}, f"Missing {name} stats"
+
+        assert set(resp.json()["post_cache"]) == {"hits", "misses", "evictions", "entries", "bytes"}
+
+        assert set(resp.json()["password_hashing"]) == {"pending", "rejected", "queue_time", "hash_time"}
+
 
 def _random_signup_request() -> dict:
     return {"username": fake.pystr(), "password": fake.pystr()}
@@ -302,7 +635,7 @@ def _random_post(author: str | None = None) -> dict:
     if author is None:
         author = fake.pystr()
 
-    return {"id": fake.pyint(min_value=1), "author": author} | _random_post_request()
+    return {"id": fake.pyint(min_value=1), "author": author, "like_count": fake.pyint()} | _random_post_request()
 
 
 def _authorize(client: httpx.AsyncClient, registry: StubUsersRegistry) -> str:
@@ -313,6 +646,12 @@ def _authorize(client: httpx.AsyncClient, registry: StubUsersRegistry) -> str:
     return username
 
 
+def _authorize_admin(client: httpx.AsyncClient, registry: StubUsersRegistry, monkeypatch: pytest.MonkeyPatch) -> str:
+    username = _authorize(client, registry)
+    monkeypatch.setattr(users, "ADMIN_USERS", frozenset([username]))
+    return username
+
+
 async def _signup(client: httpx.AsyncClient, request: dict) -> httpx.Response:
     return await client.post("/users", json=request)
 
@@ -342,10 +681,13 @@ async def _unlike_post(client: httpx.AsyncClient, post_id: posts.ID) -> httpx.Re
 
 
 async def _get_analytics(
-    client: httpx.AsyncClient, start: datetime.date | None, end: datetime.date | None
+    client: httpx.AsyncClient, start: datetime.date | None, end: datetime.date | None, group_by: str | None = None
 ) -> httpx.Response:
     params = {}
 
+    if group_by is not None:
+        params.update(group_by=group_by)
+
     if start is not None:
         params.update(date_from=start)
 